@@ -0,0 +1,171 @@
+# analytics.py
+"""
+SQL-side aggregates for the Data Analysis window.
+
+Every function runs a GROUP BY (or an index lookup) inside SQLite and returns
+a small result set, so the charts never have to pull the workouts table
+into Python. Queries without a date range read the trigger-maintained
+rollups (see rollups.py) instead of the raw workouts; all_rollups also covers
+archived workouts. Queries with a date range run on the hot table and on the
+archive partitions overlapping the range (see archive.py), and the partial
+results are merged here. Every query is scoped to the DataManager's user,
+and type filters compare integer type codes (see DataManager.type_code).
+"""
+from collections import defaultdict
+
+# SQL expressions mapping the epoch `date` column to the local start of its bucket.
+BUCKETS = {
+    "day": "date(date, 'unixepoch', 'localtime')",
+    "week": "date(date, 'unixepoch', 'localtime', 'weekday 0', '-6 days')",
+    "month": "date(date, 'unixepoch', 'localtime', 'start of month')",
+}
+
+def _where(data_manager, workout_type=None, start=None, end=None):
+    conditions, params = data_manager.workout_filters(start, end, workout_type)
+    return f"WHERE {' AND '.join(conditions)}", params
+
+def _merge_totals(results):
+    # Sum (key, count, total) rows from several sources by key.
+    totals = defaultdict(lambda: [0, 0])
+    for rows in results:
+        for key, count, total in rows:
+            totals[key][0] += count
+            totals[key][1] += total
+    return [(key, count, total) for key, (count, total) in totals.items()]
+
+def _rollup_where(data_manager, period, workout_type=None):
+    if workout_type is None:
+        return "WHERE period = ? AND user_id = ?", [period, data_manager.user_id]
+    return ("WHERE period = ? AND user_id = ? AND type_id = ?",
+            [period, data_manager.user_id, data_manager.type_code(workout_type)])
+
+def totals_by_type(data_manager, workout_type=None, start=None, end=None):
+    """
+    Count workouts and sum calories per workout type.
+
+    Parameters:
+        data_manager (DataManager): Source database.
+        workout_type (str): Only this type, or None for all types.
+        start, end: Optional date range (see tracker.to_epoch); end is exclusive.
+
+    Returns:
+        list: (workout_type, count, total_calories) tuples ordered by type.
+    """
+    if start is None and end is None:
+        where, params = _rollup_where(data_manager, "month", workout_type)
+        rows = data_manager.query("analytics.totals_by_type", f"""
+            SELECT type_id, SUM(workout_count), SUM(total_calories)
+            FROM all_rollups
+            {where}
+            GROUP BY type_id
+        """, params)
+    else:
+        where, params = _where(data_manager, workout_type, start, end)
+        rows = _merge_totals(data_manager.query_all("analytics.totals_by_type", f"""
+            SELECT type_id, COUNT(*), SUM(calories)
+            FROM workouts
+            {where}
+            GROUP BY type_id
+        """, params, start, end))
+    return sorted((data_manager.type_name(code), count, total) for code, count, total in rows)
+
+def calories_series(data_manager, bucket="day", workout_type=None, start=None, end=None):
+    """
+    Total calories per day, week or month.
+
+    Parameters:
+        data_manager (DataManager): Source database.
+        bucket (str): "day", "week" (starting Monday) or "month".
+        workout_type (str): Only this type, or None for all types.
+        start, end: Optional date range (see tracker.to_epoch); end is exclusive.
+
+    Returns:
+        list: (bucket start as "YYYY-MM-DD", workout count, total calories) tuples, oldest first.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket '{bucket}'. Use one of: {', '.join(BUCKETS)}")
+    if start is None and end is None:
+        where, params = _rollup_where(data_manager, bucket, workout_type)
+        return data_manager.query("analytics.calories_series", f"""
+            SELECT bucket, SUM(workout_count), SUM(total_calories)
+            FROM all_rollups
+            {where}
+            GROUP BY bucket
+            ORDER BY bucket
+        """, params)
+    where, params = _where(data_manager, workout_type, start, end)
+    # A week can straddle two partitions, so buckets are summed across sources.
+    return sorted(_merge_totals(data_manager.query_all("analytics.calories_series", f"""
+        SELECT {BUCKETS[bucket]} AS bucket, COUNT(*), SUM(calories)
+        FROM workouts
+        {where}
+        GROUP BY bucket
+    """, params, start, end)))
+
+def duration_histogram(data_manager, bins=10, workout_type=None, start=None, end=None):
+    """
+    Histogram of workout durations with equal-width bins.
+
+    Bins follow matplotlib's hist: they span [min, max] and the last bin
+    includes its right edge.
+
+    Parameters:
+        data_manager (DataManager): Source database.
+        bins (int): Number of bins.
+        workout_type (str): Only this type, or None for all types.
+        start, end: Optional date range (see tracker.to_epoch); end is exclusive.
+
+    Returns:
+        tuple: (edges, counts) where edges has bins + 1 values. Both are empty
+        when there are no matching workouts.
+    """
+    where, params = _where(data_manager, workout_type, start, end)
+    partitions = data_manager.partitions(start, end)
+    if start is None and end is None:
+        rollup_where, rollup_params = _rollup_where(data_manager, "month", workout_type)
+        low, high = data_manager.query("analytics.duration_bounds", f"""
+            SELECT MIN(min_duration), MAX(max_duration) FROM all_rollups {rollup_where}
+        """, rollup_params)[0]
+    else:
+        bounds = [rows[0] for rows in data_manager.query_all(
+            "analytics.duration_bounds", f"SELECT MIN(duration), MAX(duration) FROM workouts {where}",
+            params, partitions=partitions) if rows[0][0] is not None]
+        low = min((row[0] for row in bounds), default=None)
+        high = max((row[1] for row in bounds), default=None)
+    if low is None:
+        return [], []
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    width = (high - low) / bins
+    edges = [low + width * i for i in range(bins)] + [high]
+    counts = [0] * bins
+    results = data_manager.query_all("analytics.duration_histogram", f"""
+        SELECT MIN(CAST((duration - ?) / ? AS INTEGER), ?) AS bin, COUNT(*)
+        FROM workouts
+        {where}
+        GROUP BY bin
+    """, [low, width, bins - 1] + params, partitions=partitions)
+    for rows in results:
+        for index, count in rows:
+            counts[index] += count
+    return edges, counts
+
+def analysis_data(data_manager, workout_type=None, bucket="day", bins=10, start=None, end=None):
+    """
+    Everything the Data Analysis charts need, in one call.
+
+    Parameters:
+        start, end: Optional date range (see tracker.to_epoch); end is exclusive.
+
+    Returns:
+        dict: "series" from calories_series, "by_type" from totals_by_type and
+        "histogram" from duration_histogram.
+    """
+    with data_manager.metrics.timer("analytics.analysis_data"):
+        return {
+            "series": calories_series(data_manager, bucket=bucket, workout_type=workout_type,
+                                      start=start, end=end),
+            "by_type": totals_by_type(data_manager, workout_type=workout_type, start=start, end=end),
+            "histogram": duration_histogram(data_manager, bins=bins, workout_type=workout_type,
+                                            start=start, end=end),
+        }
@@ -0,0 +1,234 @@
+# archive.py
+"""
+Time-partitioned archive storage for old workouts.
+
+archive_workouts() moves workouts dated before a horizon out of the hot
+workouts table into one SQLite file per year or month, next to the
+database:
+
+    workouts.archive/
+        2022.db  2023.db  ...        (or 2024-01.db, 2024-02.db, ...)
+
+The hot database keeps a catalog of the partitions (archive_partitions) and
+the rollup totals of the archived rows (archived_rollups), so analytics over
+the whole history never opens an archive. Reads of individual rows
+(DataManager.get_workouts_page, iter_workouts, date-ranged analytics)
+run on the hot table and on the partitions whose date range they overlap,
+and merge the results; other partitions are never opened. The feature
+store (see features.py) keeps its own copy of archived workouts, so it is
+brought up to date before anything is moved.
+
+Archived workouts are read-only. A move is crash-safe without a transaction
+spanning both files: rows are first committed to the partition under a new
+batch number, then deleted from the hot table in the transaction that
+records that batch in the catalog. Readers only see committed batches, so a
+move interrupted in between is invisible and is redone by the next run.
+"""
+import argparse
+import os
+import pathlib
+import sqlite3
+from datetime import datetime, timedelta
+from features import refresh_features
+from rollups import archive_rollups, recompute_rollups
+
+GRANULARITIES = ("year", "month")
+# Slack around a moved range when recomputing hot rollups: a week bucket can
+# start or end up to six days outside a month or year, plus a DST hour.
+_BUCKET_SLACK = 8 * 86400
+
+def archive_dir(db_file):
+    """Default archive directory for a database: workouts.db -> workouts.archive."""
+    return f"{os.path.splitext(db_file)[0]}.archive"
+
+def _epoch(value):
+    return int(value.timestamp())
+
+def partition_of(date, granularity="year"):
+    """
+    Return the partition holding an epoch date.
+
+    Partitions follow local calendar years or months, like the rollup buckets.
+
+    Returns:
+        tuple: (name, start, end) with start and end as epoch seconds, end exclusive.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'. Use one of: {', '.join(GRANULARITIES)}")
+    day = datetime.fromtimestamp(date)
+    if granularity == "year":
+        return str(day.year), _epoch(datetime(day.year, 1, 1)), _epoch(datetime(day.year + 1, 1, 1))
+    start = datetime(day.year, day.month, 1)
+    end = datetime(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return f"{day.year}-{day.month:02d}", _epoch(start), _epoch(end)
+
+def _months(start, end):
+    # (start, end) of every local month in [start, end); the units a year is moved in.
+    while start < end:
+        _, _, month_end = partition_of(start, "month")
+        yield start, min(month_end, end)
+        start = month_end
+
+def partitions(conn, start=None, end=None):
+    """
+    Return the catalog entries of the partitions that can hold workouts dated [start, end).
+
+    Returns:
+        list: (name, path, start, end, batch) tuples, newest first. path is
+        relative to the database's directory.
+    """
+    return conn.execute("""
+        SELECT name, path, start, end, batch FROM archive_partitions
+        WHERE end > ? AND start < ?
+        ORDER BY start DESC
+    """, (start if start is not None else -2 ** 63, end if end is not None else 2 ** 63 - 1)).fetchall()
+
+def open_partition(db_file, path, batch):
+    """
+    Open an archive partition read-only, showing only batches up to batch.
+
+    Queries see a `workouts` table with the hot table's columns, so the same
+    SQL runs on the hot database and on every partition.
+    """
+    path = pathlib.Path(os.path.dirname(os.path.abspath(db_file)), path)
+    conn = sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True, check_same_thread=False)
+    # Temporary objects shadow the partition's own table of the same name.
+    conn.execute(f"""
+        CREATE TEMP VIEW workouts AS
+        SELECT id, date, type_id, duration, calories, user_id FROM main.workouts WHERE batch <= {int(batch)}
+    """)
+    return conn
+
+def _create_partition(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS workouts (
+            id INTEGER PRIMARY KEY,
+            date INTEGER NOT NULL,
+            type_id INTEGER NOT NULL,
+            duration INTEGER NOT NULL,
+            calories INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            batch INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_user_date ON workouts (user_id, date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_user_type_date ON workouts (user_id, type_id, date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_user_duration ON workouts (user_id, duration)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_user_calories ON workouts (user_id, calories)")
+
+def _move(conn, archive, partition, start, end):
+    """Move the hot workouts dated [start, end) into a partition; returns the number of rows moved."""
+    name, path, partition_start, partition_end = partition
+    # Every user's rows in the range, found through the (user_id, date) index.
+    where = "WHERE user_id IN (SELECT user_id FROM temp.archive_users) AND date >= ? AND date < ?"
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT batch FROM archive_partitions WHERE name = ?", (name,)).fetchone()
+        batch = row[0] if row else 0
+        # The hot write lock is held, so the copy and the delete see the same rows.
+        with archive:
+            archive.execute("DELETE FROM workouts WHERE batch > ?", (batch,))
+            moved = archive.execute(f"""
+                INSERT INTO workouts (id, date, type_id, duration, calories, user_id, batch)
+                SELECT id, date, type_id, duration, calories, user_id, ? FROM hot.workouts {where}
+            """, (batch + 1, start, end)).rowcount
+        if moved:
+            conn.execute("UPDATE db_state SET value = 1 WHERE name = 'archiving'")
+            archive_rollups(conn, where, (start, end))
+            deleted = conn.execute(f"DELETE FROM workouts {where}", (start, end)).rowcount
+            if deleted != moved:
+                raise RuntimeError(f"Copied {moved} workouts into partition {name} but deleted {deleted}.")
+            recompute_rollups(conn, where, (start - _BUCKET_SLACK, end + _BUCKET_SLACK))
+            conn.execute("UPDATE db_state SET value = 0 WHERE name = 'archiving'")
+            conn.execute("""
+                INSERT INTO archive_partitions (name, path, start, end, batch, rows)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET batch = excluded.batch, rows = rows + excluded.rows
+            """, (name, path, partition_start, partition_end, batch + 1, moved))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return moved
+
+def archive_workouts(data_manager, before, granularity="year", directory=None, report=None):
+    """
+    Move every workout in a partition that ends on or before `before` into the archive.
+
+    Only whole partitions are archived: with yearly partitions and `before` in
+    June 2024, workouts up to the end of 2023 are moved. Running it again later
+    moves workouts logged since with dates in already archived partitions too.
+    Each month is moved in its own transaction, so writers wait at most for
+    one month's worth of rows.
+
+    Parameters:
+        data_manager (DataManager): The hot database. Every user's workouts are archived.
+        before: Horizon, anything tracker.to_epoch accepts.
+        granularity (str): "year" or "month"; one archive file per partition.
+        directory (str): Where the partition files go. Defaults to archive_dir(db_file).
+        report (callable): Called with a line per partition, or None.
+
+    Returns:
+        dict: Partition name -> number of workouts moved into it.
+    """
+    from tracker import to_epoch
+    _, cutoff, _ = partition_of(to_epoch(before), granularity)
+    db_file = os.path.abspath(data_manager.db_file)
+    directory = os.path.abspath(directory or archive_dir(db_file))
+    os.makedirs(directory, exist_ok=True)
+    data_manager.flush()
+    conn = data_manager.connection
+    refresh_features(conn)
+    first = conn.execute("SELECT MIN(date) FROM workouts").fetchone()[0]
+    if first is None or first >= cutoff:
+        return {}
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_users (user_id INTEGER PRIMARY KEY)")
+    with conn:
+        conn.execute("DELETE FROM temp.archive_users")
+        conn.execute("INSERT INTO temp.archive_users SELECT DISTINCT user_id FROM workouts")
+
+    moved = {}
+    date = first
+    while date < cutoff:
+        name, start, end = partition_of(date, granularity)
+        file = os.path.join(directory, f"{name}.db")
+        archive = sqlite3.connect(file, timeout=data_manager.timeout)
+        try:
+            _create_partition(archive)
+            archive.execute("ATTACH DATABASE ? AS hot", (db_file,))
+            archive.execute("CREATE TEMP TABLE archive_users (user_id INTEGER PRIMARY KEY)")
+            archive.executemany("INSERT INTO temp.archive_users VALUES (?)",
+                                conn.execute("SELECT user_id FROM temp.archive_users").fetchall())
+            partition = (name, os.path.relpath(file, os.path.dirname(db_file)), start, end)
+            rows = sum(_move(conn, archive, partition, month_start, month_end)
+                       for month_start, month_end in _months(start, end))
+        finally:
+            archive.close()
+        if rows:
+            moved[name] = rows
+            if report:
+                report(f"{name}: archived {rows} workouts")
+        elif conn.execute("SELECT 1 FROM archive_partitions WHERE name = ?", (name,)).fetchone() is None:
+            # Nothing was ever archived here; do not leave an empty file behind.
+            os.remove(file)
+        date = end
+    return moved
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old workouts into per-year or per-month archive files.")
+    parser.add_argument("--db", default="workouts.db", help="Database file (default: workouts.db).")
+    horizon = parser.add_mutually_exclusive_group()
+    horizon.add_argument("--before", help="Archive partitions ending on or before this date (YYYY-MM-DD).")
+    horizon.add_argument("--keep-days", type=int, default=365,
+                         help="Archive partitions older than this many days (default: 365).")
+    parser.add_argument("--granularity", choices=GRANULARITIES, default="year",
+                        help="One archive file per year or per month (default: year).")
+    parser.add_argument("--dir", help="Archive directory (default: next to the database).")
+    args = parser.parse_args()
+
+    from tracker import DataManager
+    before = args.before or datetime.now() - timedelta(days=args.keep_days)
+    with DataManager(args.db) as data_manager:
+        moved = archive_workouts(data_manager, before, args.granularity, args.dir, report=print)
+    print(f"Archived {sum(moved.values())} workouts into {len(moved)} partitions." if moved
+          else "Nothing to archive.")
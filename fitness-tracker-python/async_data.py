@@ -0,0 +1,134 @@
+# async_data.py
+"""
+Non-blocking access to DataManager from the Tk main loop.
+
+Tk may only be used from the thread running mainloop, and a slow query must
+not run on that thread. AsyncDataManager runs DataManager calls on a worker
+thread and returns futures; TkDispatcher hands the results back to the Tk
+thread through a queue it polls with after(), only while work is pending.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class TkDispatcher:
+    def __init__(self, root, poll_ms=16):
+        """
+        Parameters:
+            root: Any Tk widget; its after() drives the polling.
+            poll_ms (int): Polling interval while results are outstanding. The
+                default keeps delivery within one 60 Hz frame.
+        """
+        self.root = root
+        self.poll_ms = poll_ms
+        self._results = queue.Queue()
+        self._pending = 0
+        self._polling = False
+
+    def track(self, future, callback=None, errback=None):
+        """
+        Call callback(result) or errback(exception) on the Tk thread once future is done.
+
+        Must be called from the Tk thread. Cancelled futures are dropped silently.
+        """
+        self._pending += 1
+        future.add_done_callback(lambda done: self._results.put((done, callback, errback)))
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return future
+
+    def _poll(self):
+        while True:
+            try:
+                future, callback, errback = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if future.cancelled():
+                continue
+            try:
+                error = future.exception()
+                if error is not None:
+                    if errback is None:
+                        raise error
+                    errback(error)
+                elif callback is not None:
+                    callback(future.result())
+            except Exception:
+                logger.exception("Background task failed")
+        if self._pending:
+            self.root.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
+
+class AsyncDataManager:
+    def __init__(self, data_manager, dispatcher, max_workers=1):
+        """
+        Run DataManager calls off the Tk thread.
+
+        Parameters:
+            data_manager (DataManager): The wrapped manager. Each worker thread
+                gets its own connection from it.
+            dispatcher (TkDispatcher): Delivers results to the Tk thread.
+            max_workers (int): Worker threads. With the default of one, calls run
+                in submission order, so a read always sees earlier writes.
+        """
+        self.data_manager = data_manager
+        self.dispatcher = dispatcher
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="data")
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def call(self, method, *args, callback=None, errback=None, key=None, **kwargs):
+        """
+        Run a DataManager method, or func(data_manager, ...), on the worker thread.
+
+        Parameters:
+            method: Name of a DataManager method, e.g. "log_workout", or a callable
+                taking the DataManager as its first argument, e.g. analytics.analysis_data.
+            callback (callable): Called with the result on the Tk thread.
+            errback (callable): Called with the exception on the Tk thread.
+            key (str): Coalescing key for refreshes. A newer call with the same key
+                cancels an older one that has not started yet, and the result of an
+                older one that is already running is dropped, so only the latest
+                refresh reaches the UI.
+
+        Returns:
+            concurrent.futures.Future: The pending result.
+        """
+        if isinstance(method, str):
+            func = getattr(self.data_manager, method)
+        else:
+            func = lambda *a, **kw: method(self.data_manager, *a, **kw)
+
+        future = self._executor.submit(func, *args, **kwargs)
+        if key is not None:
+            with self._lock:
+                previous = self._latest.get(key)
+                self._latest[key] = future
+            if previous is not None:
+                previous.cancel()
+            callback = self._if_latest(key, future, callback)
+            errback = self._if_latest(key, future, errback)
+        return self.dispatcher.track(future, callback, errback)
+
+    def _if_latest(self, key, future, handler):
+        if handler is None:
+            return None
+
+        def deliver(value):
+            with self._lock:
+                current = self._latest.get(key) is future
+                if current:
+                    del self._latest[key]
+            if current:
+                handler(value)
+        return deliver
+
+    def shutdown(self, wait=True):
+        """Stop accepting work; by default wait for queued calls, such as writes, to finish."""
+        self._executor.shutdown(wait=wait)
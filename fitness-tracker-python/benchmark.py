@@ -0,0 +1,257 @@
+# benchmark.py
+"""
+Repeatable benchmarks for the data, training, analysis and charting paths.
+
+Every run builds a fresh database from synthetic.generate_workouts with a
+fixed seed, so runs with the same arguments measure the same work. Results
+are written as JSON; pass a previous file to --compare to see the change per
+benchmark.
+
+    python benchmark.py --rows 1000000 --output after.json --compare before.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import analytics
+import stats
+import synthetic
+from tracker import DataManager, sort_key
+
+def measure(func, repeat=5, operations=1):
+    """
+    Time func() repeat times.
+
+    Parameters:
+        func (callable): The work to time. Called once more beforehand to warm up caches.
+        repeat (int): Number of timed runs.
+        operations (int): Operations func performs per call, for the throughput figure.
+
+    Returns:
+        dict: Per-run seconds with their min, median and mean, and operations per second at the median.
+    """
+    func()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return _summary(seconds, operations)
+
+def _summary(seconds, operations):
+    median = statistics.median(seconds)
+    return {
+        "seconds": seconds,
+        "min": min(seconds),
+        "median": median,
+        "mean": statistics.fmean(seconds),
+        "operations": operations,
+        "ops_per_second": operations / median if median > 0 else None,
+    }
+
+def log_buffered(db_file, count):
+    # A separate manager with a write-behind buffer; flushed and closed inside
+    # the timing, so every row is committed.
+    with DataManager(db_file, write_buffer_size=10000, durability="queued") as buffered:
+        for _ in range(count):
+            buffered.log_workout("Run", 30, 300)
+
+def log_concurrent(db_file, count, threads=8, **options):
+    # count workouts logged by several threads through one manager, as a
+    # server would; with a write buffer in "committed" mode every call still
+    # waits for its commit, but concurrent calls share transactions.
+    with DataManager(db_file, **options) as manager:
+        def log():
+            for _ in range(count // threads):
+                manager.log_workout("Run", 30, 300)
+        workers = [threading.Thread(target=log) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+def bench_crud(data_manager, rows, repeat, seed, ops=200):
+    results = {}
+    rng = np.random.default_rng(seed)
+    # Distinct ids for every run, so updates and deletes never hit a row twice;
+    # with few rows, each run updates and deletes fewer of them.
+    edit_ops = min(ops, rows // (2 * (repeat + 1)))
+    ids = iter(rng.choice(np.arange(1, rows + 1), size=2 * edit_ops * (repeat + 1), replace=False).tolist())
+
+    def log_single():
+        for _ in range(ops):
+            data_manager.log_workout("Run", 30, 300)
+    results["crud.log_workout"] = measure(log_single, repeat, ops)
+
+    results["crud.log_workout_buffered"] = measure(lambda: log_buffered(data_manager.db_file, ops * 10),
+                                                   repeat, ops * 10)
+
+    results["crud.log_workout_concurrent"] = measure(
+        lambda: log_concurrent(data_manager.db_file, ops * 10), repeat, ops * 10)
+    results["crud.log_workout_committed"] = measure(
+        lambda: log_concurrent(data_manager.db_file, ops * 10, write_buffer_size=10000, durability="committed"),
+        repeat, ops * 10)
+
+    def read_pages():
+        after = None
+        for _ in range(ops):
+            page = data_manager.get_workouts_page(after=after, page_size=50)
+            if not page:
+                break
+            after = sort_key(page[-1])
+    results["crud.get_workouts_page"] = measure(read_pages, repeat, ops)
+
+    results["crud.iter_workouts"] = measure(lambda: sum(1 for _ in data_manager.iter_workouts()), repeat, rows)
+
+    if edit_ops == 0:
+        return results
+
+    def update_some():
+        for _ in range(edit_ops):
+            data_manager.update_workout(next(ids), "Walk", 40, 200)
+    results["crud.update_workout"] = measure(update_some, repeat, edit_ops)
+
+    def delete_some():
+        for _ in range(edit_ops):
+            data_manager.delete_workout(next(ids))
+    results["crud.delete_workout"] = measure(delete_some, repeat, edit_ops)
+    return results
+
+def bench_training(db_file, repeat, fit_rows):
+    from sklearn.ensemble import RandomForestClassifier
+    from train_model import fetch_training_data
+    from vocabulary import WorkoutVocabulary
+
+    results = {}
+    data = {}
+
+    def fetch():
+        # A fresh vocabulary, so the saved one is neither read nor changed.
+        data["X"], data["y"] = fetch_training_data(db_file, vocabulary=WorkoutVocabulary())
+    results["training.fetch_training_data"] = measure(fetch, repeat, 1)
+
+    # The most recent fit_rows pairs, so fit time stays bounded at 10^7 rows.
+    X, y = data["X"][-fit_rows:], data["y"][-fit_rows:]
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    results["training.fit"] = measure(lambda: model.fit(X, y), max(1, repeat // 2), len(X))
+    results["training.predict"] = measure(lambda: model.predict(X[:10000]), repeat, min(len(X), 10000))
+    return results
+
+def bench_analysis(data_manager, repeat):
+    results = {}
+    for bucket in analytics.BUCKETS:
+        results[f"analysis.{bucket}"] = measure(
+            lambda bucket=bucket: analytics.analysis_data(data_manager, bucket=bucket), repeat)
+    results["analysis.day.filtered"] = measure(
+        lambda: analytics.analysis_data(data_manager, workout_type="Run"), repeat)
+    results["analysis.stats"] = measure(lambda: stats.summary(data_manager), repeat)
+    return results
+
+def bench_render(data_manager, repeat):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from charts import AnalysisCharts
+
+    results = {}
+    data = analytics.analysis_data(data_manager)
+    charts = AnalysisCharts()
+    FigureCanvasAgg(charts.figure)
+    results["render.create"] = measure(AnalysisCharts, repeat)
+
+    def render():
+        charts.update(data)
+        charts.figure.savefig(io.BytesIO(), format="png")
+    results["render.update_png"] = measure(render, repeat)
+    return results
+
+SUITES = ("crud", "training", "analysis", "render")
+
+def run(rows, repeat=5, seed=0, suites=SUITES, fit_rows=200000, workdir=None, report=print):
+    """
+    Build a synthetic database with rows workouts and run the selected suites on it.
+
+    Returns:
+        dict: {"meta": run parameters and environment, "results": name -> measure() summary}
+    """
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        db_file = os.path.join(tmp, "benchmark.db")
+        written, seconds = synthetic.build_database(db_file, rows, seed=seed)
+        results = {"insert.log_workouts_bulk": _summary([seconds], written)}
+        report(f"built {written} rows in {seconds:.2f}s")
+        with DataManager(db_file) as data_manager:
+            # Reads first, so they see the table exactly as generated.
+            if "analysis" in suites:
+                results.update(bench_analysis(data_manager, repeat))
+            if "render" in suites:
+                results.update(bench_render(data_manager, repeat))
+            if "training" in suites:
+                results.update(bench_training(db_file, repeat, fit_rows))
+            if "crud" in suites:
+                results.update(bench_crud(data_manager, rows, repeat, seed))
+        for name, summary in results.items():
+            report(f"{name}: {summary['median'] * 1000:.2f} ms median")
+
+    import matplotlib, sklearn
+    meta = {
+        "rows": rows,
+        "repeat": repeat,
+        "seed": seed,
+        "suites": list(suites),
+        "fit_rows": fit_rows,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": sqlite3.sqlite_version,
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "scikit-learn": sklearn.__version__,
+    }
+    return {"meta": meta, "results": results}
+
+def compare(current, baseline):
+    """
+    Return (name, baseline median, current median, ratio) for benchmarks present in both.
+
+    A ratio above 1 means the current run is slower.
+    """
+    rows = []
+    for name, summary in current["results"].items():
+        previous = baseline["results"].get(name)
+        if previous and previous["median"] > 0:
+            rows.append((name, previous["median"], summary["median"], summary["median"] / previous["median"]))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the fitness tracker on a synthetic history.")
+    parser.add_argument("--rows", type=int, default=100000, help="Workouts in the generated database (default: 100000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark (default: 5).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated data (default: 0).")
+    parser.add_argument("--suite", action="append", choices=SUITES,
+                        help="Run only this suite; may be repeated (default: all).")
+    parser.add_argument("--fit-rows", type=int, default=200000,
+                        help="Most recent training pairs used for the fit benchmark (default: 200000).")
+    parser.add_argument("--workdir", help="Directory for the temporary database (default: system temp).")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON file from an earlier run to compare against.")
+    args = parser.parse_args()
+
+    result = run(args.rows, repeat=args.repeat, seed=args.seed, suites=args.suite or SUITES,
+                 fit_rows=args.fit_rows, workdir=args.workdir)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}.")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("rows") != args.rows:
+            print(f"Note: the baseline used {baseline['meta'].get('rows')} rows, this run {args.rows}.")
+        for name, before, after, ratio in compare(result, baseline):
+            print(f"{name:32} {before * 1000:10.2f} ms -> {after * 1000:10.2f} ms  x{ratio:.2f}")
@@ -0,0 +1,172 @@
+# charts.py
+"""
+Chart definitions for the Data Analysis window.
+
+AnalysisCharts lays out the four charts once and then updates the existing
+artists in place for every new result from analytics.analysis_data, so
+refreshing the window never rebuilds the figure.
+"""
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+
+LINE_COLOR = "#4646A6"
+BAR_COLOR = "#2A2A72"
+PIE_COLORS = ["#4646A6", "#2A2A72", "#8E44AD"]
+HIST_COLOR = "#3A3A3C"
+
+# The calories line is downsampled to at most this many points before plotting.
+MAX_LINE_POINTS = 2000
+# Markers are only drawn while individual points are still distinguishable.
+MAX_MARKER_POINTS = 200
+
+def downsample_lttb(x, y, threshold):
+    """
+    Downsample a series with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last points and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the point
+    kept from the previous bucket and the mean of the next bucket. Peaks and
+    troughs survive, which min/max-free decimation would lose.
+
+    Parameters:
+        x (array-like): Increasing x values.
+        y (array-like): y values, same length as x.
+        threshold (int): Maximum number of points to return.
+
+    Returns:
+        tuple: (x, y) NumPy arrays with at most threshold points.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        # Twice the triangle area for every candidate in the bucket at once.
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(areas.argmax())
+        keep[i + 1] = previous
+    return x[keep], y[keep]
+
+class AnalysisCharts:
+    def __init__(self, figure=None):
+        """
+        Build the 2x2 analysis figure with empty artists.
+
+        Parameters:
+            figure (Figure): Figure to draw into. A new 9x7 inch Figure is created
+                if omitted; it is not registered with pyplot, so it is freed with
+                its window instead of accumulating in pyplot's figure list.
+        """
+        self.figure = figure if figure is not None else Figure(figsize=(9, 7))
+        self.figure.suptitle("Workout Data Analysis", fontsize=16)
+        self.axs = self.figure.subplots(2, 2)
+        axs = self.axs
+
+        # Chart 1: Line Chart - Calories Burned Over Time
+        self.calories_line, = axs[0, 0].plot([], [], marker='o', linestyle='-', color=LINE_COLOR)
+        axs[0, 0].set_title("Calories Burned Over Time")
+        axs[0, 0].set_xlabel("Date")
+        axs[0, 0].set_ylabel("Calories")
+        axs[0, 0].xaxis_date()
+        axs[0, 0].xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+        # Rotate through tick_params so the setting survives the tick labels
+        # being regenerated on every update (autofmt_xdate only touches the
+        # current ones, and hides the labels of the whole top row).
+        axs[0, 0].tick_params(axis="x", labelrotation=45)
+
+        # Chart 2: Bar Chart - Total Calories by Workout Type
+        self.type_bars = None
+        # None until the first update draws bars, even an empty set of them.
+        self.bar_types = None
+        axs[0, 1].set_title("Total Calories by Workout Type")
+        axs[0, 1].set_xlabel("Workout Type")
+        axs[0, 1].set_ylabel("Total Calories")
+
+        # Chart 3: Pie Chart - Workout Distribution (redrawn on update, it has no data setters)
+        axs[1, 0].set_title("Workout Distribution")
+
+        # Chart 4: Histogram - Workout Duration Distribution
+        self.hist_bars = None
+        axs[1, 1].set_title("Workout Duration Distribution")
+        axs[1, 1].set_xlabel("Duration (min)")
+        axs[1, 1].set_ylabel("Frequency")
+
+        self.figure.tight_layout(rect=[0, 0.03, 1, 0.95])
+
+    def update(self, data):
+        """
+        Show a new analytics.analysis_data result, reusing the existing artists.
+
+        The caller redraws the canvas afterwards (draw_idle in the UI, savefig
+        when rendering headless).
+        """
+        self._update_calories(data["series"])
+        self._update_types(data["by_type"])
+        self._update_distribution(data["by_type"])
+        self._update_durations(*data["histogram"])
+        self.figure.tight_layout(rect=[0, 0.03, 1, 0.95])
+
+    def _update_calories(self, series):
+        ax = self.axs[0, 0]
+        if series:
+            dates = mdates.date2num(np.array([row[0] for row in series], dtype="datetime64[D]"))
+            calories = np.array([row[2] for row in series], dtype=float)
+            dates, calories = downsample_lttb(dates, calories, MAX_LINE_POINTS)
+        else:
+            dates, calories = [], []
+        self.calories_line.set_data(dates, calories)
+        self.calories_line.set_marker('o' if len(dates) <= MAX_MARKER_POINTS else '')
+        ax.relim()
+        ax.autoscale_view()
+
+    def _update_types(self, by_type):
+        ax = self.axs[0, 1]
+        types = [row[0] for row in by_type]
+        totals = [row[2] for row in by_type]
+        if types == self.bar_types:
+            for bar, total in zip(self.type_bars, totals):
+                bar.set_height(total)
+        else:
+            # The set of types changed; replace only the bars, not the axes.
+            if self.type_bars is not None:
+                self.type_bars.remove()
+            positions = range(len(types))
+            self.type_bars = ax.bar(positions, totals, color=BAR_COLOR)
+            ax.set_xticks(positions, types)
+            self.bar_types = types
+        ax.relim()
+        ax.autoscale_view()
+
+    def _update_distribution(self, by_type):
+        ax = self.axs[1, 0]
+        for artist in list(ax.patches) + list(ax.texts):
+            artist.remove()
+        labels = [row[0] for row in by_type]
+        sizes = [row[1] for row in by_type]
+        if sizes:
+            ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90, colors=PIE_COLORS)
+
+    def _update_durations(self, edges, counts):
+        ax = self.axs[1, 1]
+        if self.hist_bars is None or len(self.hist_bars) != len(counts):
+            if self.hist_bars is not None:
+                self.hist_bars.remove()
+            self.hist_bars = ax.bar([0] * len(counts), [0] * len(counts), align='edge',
+                                    color=HIST_COLOR, edgecolor="white")
+        for bar, left, right, count in zip(self.hist_bars, edges, edges[1:], counts):
+            bar.set_x(left)
+            bar.set_width(right - left)
+            bar.set_height(count)
+        ax.relim()
+        ax.autoscale_view()
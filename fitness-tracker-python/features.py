@@ -0,0 +1,208 @@
+# features.py
+"""
+Feature store for the next-exercise model.
+
+workout_features holds, for every workout, what was known just before it
+was logged: the types of the user's last three workouts, the previous
+workout's duration and calories, the time since it, the calories and
+workout count of the past seven days, and the day of the week and hour.
+Together with the workout's own type that is one training example, so
+train_model.py reads its X and y straight from the table, and the app
+predicts the next workout from the same features computed for "now".
+
+All features come from SQL window functions over the user's workouts in
+(date, id) order. refresh_features() recomputes only the users with new,
+edited or deleted workouts, from the earliest changed date on, reading just
+enough earlier rows for the lags and the seven-day window; a history is
+never rebuilt row by row in Python.
+"""
+import argparse
+import sqlite3
+import time
+from migrations import migrate
+
+# Feature columns, in the order models see them. Missing history is -1 for
+# the type and time features and 0 for the sums.
+FEATURES = ("prev_type_1", "prev_type_2", "prev_type_3", "prev_duration", "prev_calories",
+            "seconds_since_previous", "calories_7d", "workouts_7d", "day_of_week", "hour")
+# Features holding workout_types codes, which models see as vocabulary codes.
+TYPE_FEATURES = ("prev_type_1", "prev_type_2", "prev_type_3")
+# Longest lag, and the rolling window in seconds.
+LAGS = 3
+WINDOW_SECONDS = 7 * 86400
+
+_BASE_COLUMNS = "id, user_id, date, type_id, duration, calories"
+# id of the extra row next_features computes; sorts after any stored row of the same second.
+_NEXT_ID = 2 ** 63 - 1
+
+def _features_sql(source):
+    """A SELECT computing every feature for the rows of `source`, a subquery with the base columns."""
+    lags = ",\n".join(f"COALESCE(LAG(type_id, {lag}) OVER history, -1) AS prev_type_{lag}"
+                      for lag in range(1, LAGS + 1))
+    return f"""
+        SELECT {_BASE_COLUMNS},
+               {lags},
+               COALESCE(LAG(duration) OVER history, 0) AS prev_duration,
+               COALESCE(LAG(calories) OVER history, 0) AS prev_calories,
+               COALESCE(date - LAG(date) OVER history, -1) AS seconds_since_previous,
+               COALESCE(SUM(calories) OVER last_week, 0) AS calories_7d,
+               COUNT(*) OVER last_week AS workouts_7d,
+               CAST(strftime('%w', date, 'unixepoch', 'localtime') AS INTEGER) AS day_of_week,
+               CAST(strftime('%H', date, 'unixepoch', 'localtime') AS INTEGER) AS hour
+        FROM ({source})
+        WINDOW history AS (PARTITION BY user_id ORDER BY date, id),
+               last_week AS (PARTITION BY user_id ORDER BY date
+                             RANGE BETWEEN {WINDOW_SECONDS} PRECEDING AND 1 PRECEDING)
+    """
+
+def _context_sql():
+    """
+    A SELECT of one user's stored rows from date :point on, plus the earlier
+    rows the features of those rows depend on: the last LAGS before :point
+    and every row in the rolling window before it.
+    """
+    return f"""
+        SELECT * FROM (
+            SELECT {_BASE_COLUMNS} FROM workout_features
+            WHERE user_id = :user_id AND date < :point
+            ORDER BY date DESC, id DESC LIMIT {LAGS}
+        )
+        UNION
+        SELECT {_BASE_COLUMNS} FROM workout_features
+        WHERE user_id = :user_id AND date >= :point - {WINDOW_SECONDS}
+    """
+
+def _load_archived(conn):
+    # The first build also copies the rows archive.py has already moved out
+    # of the hot table.
+    import archive
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+    for _, path, _, _, batch in archive.partitions(conn):
+        partition = archive.open_partition(db_file, path, batch)
+        try:
+            conn.executemany(f"INSERT INTO workout_features ({_BASE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                             partition.execute(f"SELECT {_BASE_COLUMNS} FROM workouts"))
+        finally:
+            partition.close()
+
+def refresh_features(conn, rebuild=False):
+    """
+    Bring workout_features up to date with the workouts table.
+
+    Runs in one write transaction. New workouts are appended and the features
+    of every user with new, edited or deleted workouts are recomputed from the
+    earliest affected date on. Cheap when nothing changed.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection to a migrated database.
+        rebuild (bool): Drop the stored features and compute them from scratch.
+
+    Returns:
+        int: Number of users whose features were recomputed.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if rebuild:
+            conn.execute("DELETE FROM workout_features")
+            conn.execute("DELETE FROM feature_changes")
+            conn.execute("UPDATE db_state SET value = 0 WHERE name = 'features_last_id'")
+        last_id = conn.execute("SELECT value FROM db_state WHERE name = 'features_last_id'").fetchone()[0]
+        # The AUTOINCREMENT counter rather than MAX(id): it stays put when the
+        # newest rows are deleted or archived.
+        new_last_id = conn.execute("""
+            SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'workouts'), 0)
+        """).fetchone()[0]
+        # Earliest changed date per user; that user's rows from there on are recomputed.
+        points = conn.execute("""
+            SELECT user_id, MIN(date) FROM (
+                SELECT user_id, date FROM feature_changes
+                UNION ALL
+                SELECT user_id, date FROM workouts WHERE id > ?
+            )
+            GROUP BY user_id
+        """, (last_id,)).fetchall()
+        # Replace the stored copy of every changed workout; deleted ones are
+        # simply dropped.
+        conn.execute("DELETE FROM workout_features WHERE id IN (SELECT id FROM feature_changes)")
+        conn.execute(f"""
+            INSERT INTO workout_features ({_BASE_COLUMNS})
+            SELECT {_BASE_COLUMNS} FROM workouts
+            WHERE id IN (SELECT id FROM feature_changes) OR id > ?
+        """, (last_id,))
+        conn.execute("DELETE FROM feature_changes")
+        if last_id == 0:
+            _load_archived(conn)
+            points = conn.execute("SELECT user_id, MIN(date) FROM workout_features GROUP BY user_id").fetchall()
+        columns = f"{_BASE_COLUMNS}, {', '.join(FEATURES)}"
+        for user_id, point in points:
+            conn.execute(f"""
+                INSERT OR REPLACE INTO workout_features ({columns})
+                SELECT {columns} FROM ({_features_sql(_context_sql())})
+                WHERE date >= :point
+            """, {"user_id": user_id, "point": point})
+        conn.execute("UPDATE db_state SET value = ? WHERE name = 'features_last_id'", (new_last_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(points)
+
+def refresh_store(data_manager):
+    """
+    Commit data_manager's buffered writes and bring the feature store up to date.
+
+    Call it after writing workouts, not before every read: it is a write
+    transaction, and next_features only reads the store.
+
+    Returns:
+        int: Number of users whose features were recomputed.
+    """
+    data_manager.flush()
+    with data_manager.metrics.timer("features.refresh") as timing:
+        timing.rows = refresh_features(data_manager.connection)
+    return timing.rows
+
+def next_features(data_manager, vocabulary=None, now=None):
+    """
+    The features of the user's next workout, if it were logged now.
+
+    Computed by the same SQL as the stored rows, over the user's last few
+    workouts and an extra row for now. The store is read as the last refresh
+    left it, so workouts written since then (see refresh_store) are not seen.
+
+    Parameters:
+        data_manager (DataManager): Source database; its user is used.
+        vocabulary (WorkoutVocabulary): If given, type features are translated
+            into its codes, as train_model does; types it lacks become -1.
+        now: Time of the next workout (see tracker.to_epoch). Defaults to now.
+
+    Returns:
+        list: One value per name in FEATURES.
+    """
+    from tracker import to_epoch
+    point = to_epoch(now) if now is not None else int(time.time())
+    source = f"{_context_sql()} UNION ALL SELECT {_NEXT_ID}, :user_id, :point, -1, 0, 0"
+    sql = f"SELECT {', '.join(FEATURES)} FROM ({_features_sql(source)}) WHERE id = {_NEXT_ID}"
+    values = list(data_manager.query("features.next_features", sql,
+                                     {"user_id": data_manager.user_id, "point": point})[0])
+    if vocabulary is not None:
+        for position, name in enumerate(FEATURES):
+            if name in TYPE_FEATURES and values[position] >= 0:
+                values[position] = vocabulary.encode(data_manager.type_name(values[position]))
+    return values
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh or rebuild the workout feature store.")
+    parser.add_argument("--db", default="workouts.db", help="Database file (default: workouts.db).")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every feature from scratch.")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        migrate(conn)
+        start = time.perf_counter()
+        users = refresh_features(conn, rebuild=args.rebuild)
+        rows = conn.execute("SELECT COUNT(*) FROM workout_features").fetchone()[0]
+    finally:
+        conn.close()
+    print(f"Recomputed features of {users} users in {time.perf_counter() - start:.2f}s; {rows} rows stored.")
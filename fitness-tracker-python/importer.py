@@ -0,0 +1,99 @@
+# importer.py
+import argparse
+import csv
+import json
+import os
+import time
+from itertools import islice
+from tracker import DataManager
+
+# Column names accepted for each workout field, so exports from other tools load as-is.
+COLUMN_ALIASES = {
+    "date": ("date", "timestamp", "start_time"),
+    "workout_type": ("workout_type", "type", "activity"),
+    "duration": ("duration", "duration_min", "minutes"),
+    "calories": ("calories", "kcal"),
+}
+
+def _find_column(names, field):
+    """Return the first of names that is an accepted alias for field."""
+    for alias in COLUMN_ALIASES[field]:
+        if alias in names:
+            return alias
+    raise KeyError(f"Missing column '{field}' (expected one of: {', '.join(COLUMN_ALIASES[field])})")
+
+def _normalize(record):
+    """Map a raw JSON record onto a (date, workout_type, duration, calories) tuple."""
+    return tuple(record[_find_column(record, field)] for field in COLUMN_ALIASES)
+
+def read_csv(path):
+    """Yield workouts from a CSV file with a header row, one row at a time."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader, [])]
+        # Resolve the header once instead of building a dict per row.
+        indices = [header.index(_find_column(header, field)) for field in COLUMN_ALIASES]
+        for record in reader:
+            if record:
+                yield tuple(record[i] for i in indices)
+
+def read_jsonl(path):
+    """Yield workouts from a JSON Lines file (one JSON object per line), one line at a time."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield _normalize(json.loads(line))
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "json": read_jsonl}
+
+def import_file(path, data_manager, fmt=None, chunk_size=5000, report=print):
+    """
+    Stream a CSV or JSONL file into the workouts table.
+
+    Only one chunk of rows is held in memory at a time, so files of any size
+    can be imported.
+
+    Parameters:
+        path (str): File to import.
+        data_manager (DataManager): Destination database.
+        fmt (str): "csv" or "jsonl". Guessed from the file extension if omitted.
+        chunk_size (int): Rows per transaction.
+        report (callable): Called with a progress message after every chunk, or None.
+
+    Returns:
+        tuple: (rows imported, elapsed seconds)
+    """
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt not in READERS:
+        raise ValueError(f"Unsupported format '{fmt}'. Use one of: {', '.join(READERS)}")
+    records = READERS[fmt](path)
+    imported = 0
+    start = time.perf_counter()
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        written = data_manager.log_workouts_bulk(chunk, chunk_size=chunk_size)
+        imported += written
+        elapsed = time.perf_counter() - start
+        if report:
+            report(f"{path}: {imported} rows ({imported / max(elapsed, 1e-9):,.0f} rows/s)")
+        if written < len(chunk):
+            break
+    return imported, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import workouts from CSV or JSONL files.")
+    parser.add_argument("files", nargs="+", help="CSV or JSONL files to import.")
+    parser.add_argument("--db", default="workouts.db", help="Database file (default: workouts.db).")
+    parser.add_argument("--format", choices=sorted(READERS), help="Input format, if not given by the extension.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per transaction.")
+    args = parser.parse_args()
+
+    with DataManager(args.db) as data_manager:
+        for path in args.files:
+            rows, seconds = import_file(path, data_manager, fmt=args.format, chunk_size=args.chunk_size,
+                                        report=None)
+            print(f"Imported {rows} rows from {path} in {seconds:.2f}s "
+                  f"({rows / max(seconds, 1e-9):,.0f} rows/s).")
@@ -1,36 +1,250 @@
 #branch testing 123
+import logging
+import os
+import time
+STARTUP_START = time.perf_counter()
+
+import threading
+import tkinter as tk
 import customtkinter as ctk
+from collections import OrderedDict
+from concurrent.futures import Future
 from tkinter import messagebox, ttk, Menu
-import pickle
-import numpy as np
-from tracker import DataManager
+import analytics
+import features
+import stats
+from async_data import AsyncDataManager, TkDispatcher
+from tracker import DataManager, format_date, sort_key
+from vocabulary import WorkoutVocabulary
+
+# numpy, scikit-learn (via the pickled model) and matplotlib are imported on
+# first use or on a background thread once the window is up.
+IMPORT_SECONDS = time.perf_counter() - STARTUP_START
+# Set FITNESS_TRACKER_TIMINGS=1 to print startup timings.
+REPORT_TIMINGS = bool(os.environ.get("FITNESS_TRACKER_TIMINGS"))
+# Set FITNESS_TRACKER_METRICS to a .json or .prom path to export the metrics on exit.
+METRICS_FILE = os.environ.get("FITNESS_TRACKER_METRICS")
+# How often the Tk loop checks for finished background work, in milliseconds;
+# one 60 Hz frame, so results show up without a visible delay.
+BACKGROUND_POLL_MS = 16
+MODEL_FILE = "next_exercise_model.pkl"
+
+logger = logging.getLogger(__name__)
+
+def load_predictor(model_file=MODEL_FILE):
+    """
+    Unpickle the next-exercise model and wrap it in a NextExercisePredictor.
+    
+    Returns:
+        NextExercisePredictor: None if the model has not been trained yet.
+    """
+    import train_model
+    try:
+        checkpoint = train_model.load_model(model_file)
+    except Exception:
+        logger.exception("Could not load the prediction model")
+        checkpoint = None
+    if checkpoint is None:
+        logger.info("Prediction model not found. Train the model first.")
+        return None
+    return checkpoint_predictor(checkpoint)
+
+def checkpoint_predictor(checkpoint):
+    """
+    Build a NextExercisePredictor from a train_model checkpoint.
+
+    Returns:
+        NextExercisePredictor: None if the model was trained on other features
+        than the feature store's and must be retrained first.
+    """
+    from predictor import NextExercisePredictor
+    if checkpoint["features"] != list(features.FEATURES):
+        logger.info("The prediction model was trained on older features; it will be retrained.")
+        return None
+    if checkpoint["vocabulary"] is None:
+        vocabulary = WorkoutVocabulary.load()
+    else:
+        vocabulary = WorkoutVocabulary(checkpoint["vocabulary"])
+    return NextExercisePredictor(checkpoint["model"], vocabulary)
+
+def retrain_predictor(db_file, model_file=MODEL_FILE):
+    """Update the model with train_incremental; returns a new predictor, or None if unchanged."""
+    import train_model
+    try:
+        checkpoint = train_model.train_incremental(db_file, model_file)
+    except Exception:
+        logger.exception("Error retraining the prediction model")
+        return None
+    return checkpoint_predictor(checkpoint) if checkpoint is not None else None
+
+def predict_next(data_manager, predictor):
+    """
+    Predict the type of the user's next workout from the feature store; runs on the data worker.
+
+    Only reads the store; refresh_prediction brings it up to date after writes.
+    """
+    with data_manager.metrics.timer("predict_next"):
+        return predictor.predict_name(features.next_features(data_manager, predictor.vocabulary))
+
+def import_plotting():
+    """Import the plotting stack so the first Data Analysis click does not pay for it."""
+    import matplotlib.style
+    import matplotlib.backends.backend_tkagg
+    import charts
 
 # Custom GradientFrame that draws a vertical gradient background.
+# The gradient is a single PhotoImage shown by one canvas item, cached per
+# (width, height, start_color, end_color) and only rebuilt when the size changes.
 class GradientFrame(ctk.CTkFrame):
+    # Shared by every GradientFrame; the oldest image is dropped past the limit.
+    _image_cache = OrderedDict()
+    IMAGE_CACHE_SIZE = 8
+    
     def __init__(self, master, start_color, end_color, **kwargs):
         super().__init__(master, **kwargs)
         self.start_color = start_color
         self.end_color = end_color
+        self._drawn_size = None
         self.canvas = ctk.CTkCanvas(self, highlightthickness=0)
         self.canvas.pack(fill="both", expand=True)
+        self._image_item = self.canvas.create_image(0, 0, anchor="nw", tags=("gradient",))
         self.bind("<Configure>", self._draw_gradient)
 
     def _draw_gradient(self, event=None):
         width = self.winfo_width()
         height = self.winfo_height()
-        self.canvas.delete("gradient")
+        if (width, height) == self._drawn_size or width <= 1 or height <= 1:
+            return
+        self._drawn_size = (width, height)
+        # Keep a reference: Tk frees a PhotoImage once Python drops it, and the
+        # shared cache may evict this one while it is still on screen.
+        self._image = self._gradient_image(width, height)
+        self.canvas.itemconfigure(self._image_item, image=self._image)
+        self.canvas.lower("gradient")
+
+    def _gradient_image(self, width, height):
+        key = (width, height, self.start_color, self.end_color)
+        cache = GradientFrame._image_cache
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
         (r1, g1, b1) = self.winfo_rgb(self.start_color)
         (r2, g2, b2) = self.winfo_rgb(self.end_color)
         r_ratio = (r2 - r1) / height
         g_ratio = (g2 - g1) / height
         b_ratio = (b2 - b1) / height
-        for i in range(height):
-            nr = int(r1 + (r_ratio * i))
-            ng = int(g1 + (g_ratio * i))
-            nb = int(b1 + (b_ratio * i))
-            color = f"#{nr >> 8:02x}{ng >> 8:02x}{nb >> 8:02x}"
-            self.canvas.create_line(0, i, width, i, fill=color, tags=("gradient",))
-        self.canvas.lower("gradient")
+        # One color per pixel row, as a one-pixel-wide column in PhotoImage
+        # data format ("{row} {row} ...").
+        column = " ".join(
+            f"{{#{int(r1 + r_ratio * i) >> 8:02x}{int(g1 + g_ratio * i) >> 8:02x}{int(b1 + b_ratio * i) >> 8:02x}}}"
+            for i in range(height)
+        )
+        image = tk.PhotoImage(master=self.canvas, width=width, height=height)
+        # put() tiles the column across the whole image in a single Tk call.
+        image.put(column, to=(0, 0, width, height))
+        cache[key] = image
+        if len(cache) > self.IMAGE_CACHE_SIZE:
+            cache.popitem(last=False)
+        return image
+
+# Treeview over the workouts table that only loads the rows the user scrolls to.
+# Pages are fetched on the data worker thread and inserted when they arrive.
+class LazyWorkoutTable:
+    # (heading, column) pairs; the column is what get_workouts_page sorts by.
+    COLUMNS = (
+        ("Date", "date"),
+        ("Workout Type", "workout_type"),
+        ("Duration (min)", "duration"),
+        ("Calories", "calories"),
+    )
+    
+    def __init__(self, master, async_data, page_size=50):
+        self.async_data = async_data
+        self.metrics = async_data.data_manager.metrics
+        self.page_size = page_size
+        self.order_by = "date"
+        self.descending = True
+        self._after = None
+        self._exhausted = False
+        self._loading = False
+        
+        headings = [heading for heading, _ in self.COLUMNS]
+        self.tree = ttk.Treeview(master, columns=headings, show="headings", selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(master, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        for heading, column in self.COLUMNS:
+            self.tree.heading(heading, text=heading, command=lambda column=column: self.sort_by(column))
+            self.tree.column(heading, anchor="center")
+        self._update_headings()
+        # Page requests share one coalescing key, so re-sorting drops a page
+        # still in flight for the old order.
+        self._page_key = f"workout-page-{id(self)}"
+    
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        # Fetch the next page once the viewport gets close to the last loaded row.
+        # This also keeps loading until a short first page fills the viewport.
+        if float(last) >= 0.9 and not self._exhausted and not self._loading:
+            self.load_more()
+    
+    def load_more(self):
+        """Request the next page; it is inserted by _insert_page when it arrives."""
+        if self._exhausted:
+            return None
+        self._loading = True
+        return self.async_data.call(
+            "get_workouts_page",
+            after=self._after,
+            page_size=self.page_size,
+            order_by=self.order_by,
+            descending=self.descending,
+            callback=self._insert_page,
+            errback=self._on_page_error,
+            key=self._page_key
+        )
+    
+    def _on_page_error(self, error):
+        self._loading = False
+        logger.error("Error loading workouts: %s", error)
+    
+    def _insert_page(self, page):
+        self._loading = False
+        if not self.tree.winfo_exists():
+            return  # The window was closed while the page was loading.
+        with self.metrics.timer("ui.table_page") as timing:
+            for workout in page:
+                # An edit can move a loaded row past the keyset cursor, so a
+                # later page may return it again; it is already shown.
+                if self.tree.exists(str(workout[0])):
+                    continue
+                self.tree.insert("", "end", iid=str(workout[0]),
+                                 values=(format_date(workout[1]), workout[2], workout[3], workout[4]))
+            timing.rows = len(page)
+        if page:
+            self._after = sort_key(page[-1], self.order_by)
+        self._exhausted = len(page) < self.page_size
+    
+    def sort_by(self, column):
+        """Re-sort in SQL by column, toggling direction when it is already the sort column."""
+        if column == self.order_by:
+            self.descending = not self.descending
+        else:
+            self.order_by = column
+            self.descending = column == "date"
+        self.reload()
+    
+    def reload(self):
+        self.tree.delete(*self.tree.get_children())
+        self._after = None
+        self._exhausted = False
+        self._update_headings()
+        self.load_more()
+        self.tree.yview_moveto(0)
+    
+    def _update_headings(self):
+        for heading, column in self.COLUMNS:
+            arrow = (" \u25bc" if self.descending else " \u25b2") if column == self.order_by else ""
+            self.tree.heading(heading, text=heading + arrow)
 
 class FitnessTrackerApp(ctk.CTk):
     def __init__(self):
@@ -46,16 +260,23 @@ class FitnessTrackerApp(ctk.CTk):
         self.title_font = ctk.CTkFont(family="Segoe UI", size=32, weight="bold")
         self.base_font = ctk.CTkFont(family="Segoe UI", size=18)
         
-        # Initialize DataManager.
+        # Initialize DataManager. The UI only reaches it through async_data, which
+        # runs every query on a worker thread so the event loop never waits on disk;
+        # the one exception is workout_types(), which is served from memory.
         self.data_manager = DataManager()
-        
-        # Load the prediction model if available.
-        try:
-            with open("next_exercise_model.pkl", "rb") as f:
-                self.predictor = pickle.load(f)
-        except Exception as e:
-            self.predictor = None
-            print("Prediction model not found. Train the model first.")
+        self.metrics = self.data_manager.metrics
+        self.dispatcher = TkDispatcher(self, poll_ms=BACKGROUND_POLL_MS)
+        self.async_data = AsyncDataManager(self.data_manager, self.dispatcher)
+        # Catch the feature store up with workouts written since the last run,
+        # e.g. by the importer, before the first prediction reads it.
+        self.async_data.call(features.refresh_store, key="features")
+        self.startup_timings = {"imports": IMPORT_SECONDS}
+        
+        # The prediction model is loaded in the background once the window is up.
+        self.predictor = None
+        self.predictor_loaded = False
+        self._retraining = False
+        self._retrain_requested = False
         
         # Create a gradient background.
         self.bg_frame = GradientFrame(self, start_color="#2A2A72", end_color="#4646A6")
@@ -67,6 +288,90 @@ class FitnessTrackerApp(ctk.CTk):
         
         self.create_widgets()
         self.update_prediction_label()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        self.record_timing("window built")
+        self.after_idle(self._on_first_frame)
+    
+    def record_timing(self, name):
+        """Record the seconds elapsed since startup under name."""
+        self.startup_timings[name] = time.perf_counter() - STARTUP_START
+        if REPORT_TIMINGS:
+            print(f"[startup] {name}: {self.startup_timings[name]:.3f}s")
+    
+    def _on_first_frame(self):
+        self.record_timing("first frame")
+        self.run_in_background(load_predictor, self._on_predictor_loaded)
+    
+    def _on_predictor_loaded(self, predictor):
+        # A background retrain may already have installed a newer model.
+        if not self.predictor_loaded:
+            self.predictor = predictor
+        self.predictor_loaded = True
+        self.record_timing("model loaded")
+        self.update_prediction_label()
+        if self.predictor is None and os.path.exists(MODEL_FILE):
+            # A model from before the feature store; replace it in the background.
+            self.schedule_retrain()
+        self.run_in_background(import_plotting, lambda _: self.record_timing("plotting ready"))
+    
+    def schedule_retrain(self):
+        """
+        Retrain the model with the newly logged workouts on a background thread.
+        
+        Requests made while a retrain is running are coalesced into one more run.
+        The new model replaces the old one on the Tk thread in a single
+        assignment, so predictions never see a half-updated model.
+        """
+        if self._retraining:
+            self._retrain_requested = True
+            return
+        self._retraining = True
+        self._retrain_requested = False
+        db_file = self.data_manager.db_file
+        self.run_in_background(lambda: retrain_predictor(db_file), self._on_retrained)
+    
+    def _on_retrained(self, predictor):
+        self._retraining = False
+        if predictor is not None:
+            # The new predictor starts with an empty memo, so swapping it in
+            # also drops every prediction of the old model.
+            self.predictor = predictor
+            self.predictor_loaded = True
+            self.update_prediction_label()
+        if self._retrain_requested:
+            self.schedule_retrain()
+    
+    def run_in_background(self, func, on_done=None):
+        """
+        Run func() on a daemon thread and call on_done(result) on the Tk thread.
+        
+        Used for model work, which should not hold up the data worker; results
+        come back through the same dispatcher as the database calls.
+        """
+        future = Future()
+        
+        def worker():
+            try:
+                future.set_result(func())
+            except Exception as e:
+                future.set_exception(e)
+        
+        self.dispatcher.track(future, on_done)
+        threading.Thread(target=worker, daemon=True).start()
+        return future
+    
+    def on_close(self):
+        # Let queued writes finish, then release the database connections
+        # before the window goes away.
+        self.async_data.shutdown()
+        self.data_manager.close()
+        if METRICS_FILE:
+            try:
+                self.metrics.write(METRICS_FILE)
+            except OSError:
+                logger.exception("Could not write metrics to %s", METRICS_FILE)
+        self.destroy()
         
     def create_widgets(self):
         # Title label.
@@ -105,7 +410,7 @@ class FitnessTrackerApp(ctk.CTk):
         self.workout_type_combobox = ctk.CTkComboBox(
             self.form_frame,
             variable=self.workout_type_var,
-            values=["Run", "Walk", "Strenght"],
+            values=self.data_manager.workout_types(),
             font=self.base_font,
             dropdown_font=self.base_font,
             width=250,
@@ -172,41 +477,58 @@ class FitnessTrackerApp(ctk.CTk):
         )
         self.view_button.grid(row=0, column=1, padx=20, pady=10, sticky="ew")
         
+        self.insights_frame = ctk.CTkFrame(self.card_frame, fg_color="transparent")
+        self.insights_frame.grid(row=5, column=0, columnspan=2, padx=40, pady=(0, 30), sticky="ew")
+        self.insights_frame.columnconfigure((0, 1), weight=1)
+        
         self.analysis_button = ctk.CTkButton(
-            self.card_frame,
+            self.insights_frame,
             text="Data Analysis",
             command=self.show_data_analysis,
             font=self.base_font,
             fg_color="#4646A6",
             hover_color="#3A3A8D"
         )
-        self.analysis_button.grid(row=5, column=0, columnspan=2, padx=40, pady=(0, 30), sticky="ew")
+        self.analysis_button.grid(row=0, column=0, padx=20, sticky="ew")
+        
+        self.stats_button = ctk.CTkButton(
+            self.insights_frame,
+            text="Statistics",
+            command=self.show_stats,
+            font=self.base_font,
+            fg_color="#2A2A72",
+            hover_color="#1F1F5E"
+        )
+        self.stats_button.grid(row=0, column=1, padx=20, sticky="ew")
         
     def update_prediction_label(self):
         """
         Update the next exercise prediction.
-        For this simple example, we simulate a prediction using the current input.
-        In a real application, you would engineer features from historical data.
+        The features describe the user's history up to now and come from the
+        feature store, the same ones the model was trained on, so they are
+        read on the data worker and the label is filled in when they arrive.
         """
+        if not self.predictor_loaded:
+            self.prediction_label.configure(text="Next Recommended Exercise: (Loading...)")
+            return
         if self.predictor is None:
             self.prediction_label.configure(text="Next Recommended Exercise: (Train model)")
             return
         
-        # Example feature: [encoded current workout type, current duration]
-        # We'll use a simple mapping for this example.
-        mapping = {"Run": 0, "Walk": 1, "Strenght": 2}
-        current_type = self.workout_type_var.get()
-        try:
-            current_duration = int(self.duration_entry.get())
-        except ValueError:
-            current_duration = 30  # default duration if not set
-        feature = [mapping.get(current_type, 0), current_duration]
-        features = np.array(feature).reshape(1, -1)
-        pred_numeric = self.predictor.predict(features)[0]
-        # Reverse mapping:
-        reverse_mapping = {0: "Run", 1: "Walk", 2: "Strenght"}
-        predicted_exercise = reverse_mapping.get(pred_numeric, "Run")
-        self.prediction_label.configure(text=f"Next Recommended Exercise: {predicted_exercise}")
+        def show_prediction(predicted_exercise):
+            self.prediction_label.configure(text=f"Next Recommended Exercise: {predicted_exercise}")
+        
+        self.async_data.call(predict_next, self.predictor, callback=show_prediction, key="prediction")
+    
+    def refresh_prediction(self):
+        """
+        Bring the feature store up to date after a write, then update the prediction.
+
+        The data worker runs calls in order, so the prediction reads the
+        refreshed store; predicting itself never writes.
+        """
+        self.async_data.call(features.refresh_store, key="features")
+        self.update_prediction_label()
     
     def log_workout(self):
         workout_type = self.workout_type_var.get()
@@ -224,21 +546,39 @@ class FitnessTrackerApp(ctk.CTk):
             messagebox.showerror("Input Error", "Duration and Calories must be numbers.")
             return
         
-        if self.data_manager.log_workout(workout_type, duration, calories):
+        # The button stays disabled until the write is done, so a double click
+        # cannot log the workout twice.
+        self.log_button.configure(state="disabled")
+        self.async_data.call("log_workout", workout_type, duration, calories,
+                             callback=lambda logged: self._on_workout_logged(logged, workout_type, duration, calories))
+    
+    def _on_workout_logged(self, logged, workout_type, duration, calories):
+        self.log_button.configure(state="normal")
+        if logged:
             messagebox.showinfo("Success", f"Logged {workout_type} for {duration} minutes burning {calories} calories.")
+            # A new type typed into the box is now in the dictionary, so offer it from now on.
+            self.workout_type_combobox.configure(values=self.data_manager.workout_types())
             self.workout_type_var.set("Run")
             self.duration_entry.delete(0, "end")
             self.calories_entry.delete(0, "end")
-            self.update_prediction_label()  # Update prediction after logging a workout.
+            self.refresh_prediction()  # Update prediction after logging a workout.
+            self.schedule_retrain()  # Learn from the new workout in the background.
         else:
             messagebox.showerror("Error", "Failed to log workout. Please try again.")
+    
+    def when_workouts_exist(self, action):
+        """Call action() on the Tk thread if any workout has been logged, else say there are none."""
+        def check(page):
+            if page:
+                action()
+            else:
+                messagebox.showinfo("No Data", "No workouts logged yet.")
+        self.async_data.call("get_workouts_page", page_size=1, callback=check)
             
     def view_workouts(self):
-        workouts = self.data_manager.get_past_workouts()
-        if not workouts:
-            messagebox.showinfo("No Data", "No workouts logged yet.")
-            return
-        
+        self.when_workouts_exist(self._open_workouts_window)
+    
+    def _open_workouts_window(self):
         view_window = ctk.CTkToplevel(self)
         view_window.title("Past Workouts")
         view_window.geometry("900x650")
@@ -268,22 +608,13 @@ class FitnessTrackerApp(ctk.CTk):
                         rowheight=45)
         style.configure("Treeview.Heading", font=("Segoe UI", 14, "bold"))
         
-        columns = ("Date", "Workout Type", "Duration (min)", "Calories")
-        tree = ttk.Treeview(table_card, columns=columns, show="headings", selectmode="browse")
+        # Rows are fetched a page at a time as the user scrolls, and clicking a
+        # heading sorts in SQL, so opening the window costs one small query.
+        table = LazyWorkoutTable(table_card, self.async_data)
+        tree = table.tree
         tree.pack(side="left", fill="both", expand=True, padx=(10, 0), pady=10)
-        
-        scrollbar = ttk.Scrollbar(table_card, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side="right", fill="y", padx=(0, 10), pady=10)
-        
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, anchor="center")
-        
-        for workout in workouts:
-            workout_id = workout[0]
-            tree.insert("", "end", iid=str(workout_id),
-                        values=(workout[1], workout[2], workout[3], workout[4]))
+        table.scrollbar.pack(side="right", fill="y", padx=(0, 10), pady=10)
+        table.load_more()
         
         tree.bind("<Button-3>", lambda event: self.show_context_menu(event, tree))
     
@@ -319,7 +650,8 @@ class FitnessTrackerApp(ctk.CTk):
         wt_label = ctk.CTkLabel(form, text="Workout Type:", font=self.base_font, text_color="white")
         wt_label.grid(row=0, column=0, padx=10, pady=10, sticky="e")
         wt_var = ctk.StringVar(value=current_values[1])
-        wt_entry = ctk.CTkEntry(form, font=self.base_font, textvariable=wt_var, justify="center")
+        wt_entry = ctk.CTkComboBox(form, font=self.base_font, variable=wt_var,
+                                   values=self.data_manager.workout_types(), justify="center")
         wt_entry.grid(row=0, column=1, padx=10, pady=10, sticky="w")
         
         d_label = ctk.CTkLabel(form, text="Duration (min):", font=self.base_font, text_color="white")
@@ -347,13 +679,24 @@ class FitnessTrackerApp(ctk.CTk):
                 messagebox.showwarning("Input Error", "Workout type cannot be empty.")
                 return
             
-            if self.data_manager.update_workout(int(workout_id), new_type, new_duration, new_calories):
+            def on_updated(updated):
+                if not updated:
+                    messagebox.showerror("Error", "Failed to update workout.")
+                    if update_btn.winfo_exists():
+                        update_btn.configure(state="normal")
+                    return
                 messagebox.showinfo("Success", "Workout updated successfully.")
-                current_date = tree.item(workout_id)["values"][0]
-                tree.item(workout_id, values=(current_date, new_type, new_duration, new_calories))
-                edit_window.destroy()
-            else:
-                messagebox.showerror("Error", "Failed to update workout.")
+                self.refresh_prediction()
+                self.workout_type_combobox.configure(values=self.data_manager.workout_types())
+                if tree.winfo_exists() and tree.exists(workout_id):
+                    current_date = tree.item(workout_id)["values"][0]
+                    tree.item(workout_id, values=(current_date, new_type, new_duration, new_calories))
+                if edit_window.winfo_exists():
+                    edit_window.destroy()
+            
+            update_btn.configure(state="disabled")
+            self.async_data.call("update_workout", int(workout_id), new_type, new_duration, new_calories,
+                                 callback=on_updated)
         
         update_btn = ctk.CTkButton(edit_window, text="Update Workout", command=update_action,
                                    font=self.base_font, fg_color="#4646A6", hover_color="#3A3A8D")
@@ -361,18 +704,21 @@ class FitnessTrackerApp(ctk.CTk):
         
     def delete_workout(self, workout_id, tree):
         if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this workout?"):
-            if self.data_manager.delete_workout(int(workout_id)):
+            def on_deleted(deleted):
+                if not deleted:
+                    messagebox.showerror("Error", "Failed to delete workout.")
+                    return
                 messagebox.showinfo("Deleted", "Workout deleted successfully.")
-                tree.delete(workout_id)
-            else:
-                messagebox.showerror("Error", "Failed to delete workout.")
+                self.refresh_prediction()
+                if tree.winfo_exists() and tree.exists(workout_id):
+                    tree.delete(workout_id)
+            
+            self.async_data.call("delete_workout", int(workout_id), callback=on_deleted)
     
     def show_data_analysis(self):
-        workouts = self.data_manager.get_past_workouts()
-        if not workouts:
-            messagebox.showinfo("No Data", "No workouts logged yet.")
-            return
-
+        self.when_workouts_exist(self._open_analysis_window)
+    
+    def _open_analysis_window(self):
         analysis_window = ctk.CTkToplevel(self)
         analysis_window.title("Data Analysis")
         analysis_window.geometry("900x700")
@@ -381,104 +727,139 @@ class FitnessTrackerApp(ctk.CTk):
         analysis_window.attributes("-topmost", True)
         analysis_window.after_idle(lambda: analysis_window.attributes("-topmost", False))
 
-        # Create a filter panel with only an Exercise Type filter.
+        # Create a filter panel with an Exercise Type filter and the time grouping.
         filter_frame = ctk.CTkFrame(analysis_window, fg_color="#1E1E2F", corner_radius=10)
         filter_frame.pack(fill="x", padx=20, pady=10)
 
         exercise_label = ctk.CTkLabel(filter_frame, text="Exercise Type:", font=self.base_font, text_color="white")
         exercise_label.grid(row=0, column=0, padx=5, pady=5, sticky="w")
-        exercise_filter = ctk.CTkComboBox(filter_frame, font=self.base_font, values=["All", "Run", "Walk", "Strenght"], width=120, justify="center")
+        exercise_filter = ctk.CTkComboBox(filter_frame, font=self.base_font, values=["All"] + self.data_manager.workout_types(), width=120, justify="center")
         exercise_filter.set("All")
         exercise_filter.grid(row=0, column=1, padx=5, pady=5)
 
+        group_label = ctk.CTkLabel(filter_frame, text="Group By:", font=self.base_font, text_color="white")
+        group_label.grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        group_filter = ctk.CTkComboBox(filter_frame, font=self.base_font, values=["Day", "Week", "Month"], width=100, justify="center")
+        group_filter.set("Day")
+        group_filter.grid(row=0, column=3, padx=5, pady=5)
+
         apply_btn = ctk.CTkButton(filter_frame, text="Apply Filter", font=self.base_font,
                                    fg_color="#4646A6", hover_color="#3A3A8D",
                                    command=lambda: update_plot())
-        apply_btn.grid(row=0, column=2, padx=5, pady=5)
+        apply_btn.grid(row=0, column=4, padx=5, pady=5)
 
         plot_frame = ctk.CTkFrame(analysis_window, fg_color="transparent")
         plot_frame.pack(fill="both", expand=True, padx=20, pady=10)
 
+        # Usually already imported in the background by import_plotting.
+        import matplotlib.style
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from charts import AnalysisCharts
+
+        try:
+            matplotlib.style.use('seaborn-darkgrid')
+        except Exception as e:
+            matplotlib.style.use('dark_background')
+
+        # The figure and canvas are built once; each update only swaps artist data.
+        charts = AnalysisCharts()
+        canvas = FigureCanvasTkAgg(charts.figure, master=plot_frame)
+        canvas.get_tk_widget().pack(fill="both", expand=True)
+
+        # Refreshes whose idle redraw has not run yet, as (click, artist update) times.
+        # One redraw can serve several of them.
+        pending_draws = []
+
+        def on_drawn(event):
+            drawn = time.perf_counter()
+            for requested, updated in pending_draws:
+                # From the artist update to the finished render.
+                self.metrics.observe("ui.analysis_draw", drawn - updated)
+                # From the click to the finished drawing, including time spent queued.
+                self.metrics.observe("ui.analysis_refresh", drawn - requested)
+            pending_draws.clear()
+
+        canvas.mpl_connect("draw_event", on_drawn)
+
+        def show_data(data, requested):
+            if not analysis_window.winfo_exists():
+                return  # Closed while the query was running.
+            pending_draws.append((requested, time.perf_counter()))
+            charts.update(data)
+            canvas.draw_idle()
+
         def update_plot():
             exercise_val = exercise_filter.get()
-            filtered_workouts = []
-            import datetime
-            for w in workouts:
-                if exercise_val != "All" and w[2] != exercise_val:
-                    continue
-                filtered_workouts.append(w)
-
-            # Clear any existing plots.
-            for widget in plot_frame.winfo_children():
-                widget.destroy()
-
-            filtered_dates = []
-            filtered_cal_values = []
-            filtered_durations = []
-            total_calories_by_type = {}
-            count_by_type = {}
-            for w in filtered_workouts:
-                try:
-                    dt = datetime.datetime.strptime(w[1], "%Y-%m-%d %H:%M:%S")
-                    filtered_dates.append(dt)
-                    filtered_cal_values.append(w[4])
-                    filtered_durations.append(w[3])
-                    wt = w[2]
-                    total_calories_by_type[wt] = total_calories_by_type.get(wt, 0) + w[4]
-                    count_by_type[wt] = count_by_type.get(wt, 0) + 1
-                except Exception as ex:
-                    print("Error processing workout:", ex)
-                    continue
-
-            import matplotlib.pyplot as plt
-            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-            import matplotlib.dates as mdates
+            workout_type = None if exercise_val == "All" else exercise_val
+            bucket = group_filter.get().lower()
 
-            try:
-                plt.style.use('seaborn-darkgrid')
-            except Exception as e:
-                plt.style.use('dark_background')
-
-            fig, axs = plt.subplots(2, 2, figsize=(9, 7))
-            fig.suptitle("Workout Data Analysis", fontsize=16)
-
-            # Chart 1: Line Chart - Calories Burned Over Time
-            axs[0, 0].plot(filtered_dates, filtered_cal_values, marker='o', linestyle='-', color="#4646A6")
-            axs[0, 0].set_title("Calories Burned Over Time")
-            axs[0, 0].set_xlabel("Date")
-            axs[0, 0].set_ylabel("Calories")
-            axs[0, 0].xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-            fig.autofmt_xdate(rotation=45, ha='right')
-
-            # Chart 2: Bar Chart - Total Calories by Workout Type
-            types = list(total_calories_by_type.keys())
-            totals = [total_calories_by_type[t] for t in types]
-            axs[0, 1].bar(types, totals, color="#2A2A72")
-            axs[0, 1].set_title("Total Calories by Workout Type")
-            axs[0, 1].set_xlabel("Workout Type")
-            axs[0, 1].set_ylabel("Total Calories")
-
-            # Chart 3: Pie Chart - Workout Distribution
-            labels = list(count_by_type.keys())
-            sizes = [count_by_type[t] for t in labels]
-            axs[1, 0].pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90,
-                          colors=["#4646A6", "#2A2A72", "#8E44AD"])
-            axs[1, 0].set_title("Workout Distribution")
-
-            # Chart 4: Histogram - Workout Duration Distribution
-            axs[1, 1].hist(filtered_durations, bins=10, color="#3A3A3C", edgecolor="white")
-            axs[1, 1].set_title("Workout Duration Distribution")
-            axs[1, 1].set_xlabel("Duration (min)")
-            axs[1, 1].set_ylabel("Frequency")
-
-            fig.tight_layout(rect=[0, 0.03, 1, 0.95])
-            canvas = FigureCanvasTkAgg(fig, master=plot_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill="both", expand=True)
+            # All aggregation happens in SQL on the data worker; only the small
+            # results come back. Repeated clicks while a query is still running
+            # are coalesced, so only the latest filter is drawn.
+            requested = time.perf_counter()
+            self.async_data.call(analytics.analysis_data, workout_type=workout_type, bucket=bucket,
+                                 callback=lambda data: show_data(data, requested),
+                                 key=f"analysis-{id(charts)}")
 
         update_plot()
+    
+    def show_stats(self):
+        self.when_workouts_exist(self._open_stats_window)
+    
+    def _open_stats_window(self):
+        stats_window = ctk.CTkToplevel(self)
+        stats_window.title("Statistics")
+        stats_window.geometry("460x520")
+        stats_window.transient(self)
+        stats_window.lift()
+        stats_window.attributes("-topmost", True)
+        stats_window.after_idle(lambda: stats_window.attributes("-topmost", False))
+        
+        stats_card = ctk.CTkFrame(stats_window, fg_color="#1E1E2F", corner_radius=10)
+        stats_card.pack(fill="both", expand=True, padx=20, pady=20)
+        heading_font = ctk.CTkFont(family="Segoe UI", size=20, weight="bold")
+        labels = {}
+        row = 0
+        for section, names in (("Moving Averages", [f"{days}-day" for days in stats.WINDOWS]),
+                               ("Streaks", ["Current", "Longest"]),
+                               ("Personal Records", ["records"])):
+            ctk.CTkLabel(stats_card, text=section, font=heading_font, text_color="white").grid(
+                row=row, column=0, sticky="w", padx=20, pady=(15, 5))
+            row += 1
+            for name in names:
+                labels[name] = ctk.CTkLabel(stats_card, text="...", font=self.base_font,
+                                            text_color="lightblue", justify="left")
+                labels[name].grid(row=row, column=0, sticky="w", padx=30, pady=2)
+                row += 1
+        
+        def show_stats(summary):
+            if not stats_window.winfo_exists():
+                return  # Closed while the query was running.
+            for days, average in summary["averages"].items():
+                labels[f"{days}-day"].configure(
+                    text=f"{days} days: {average['calories']:.0f} kcal/day, {average['duration']:.0f} min/day")
+            for name in ("Current", "Longest"):
+                days, first_day, last_day = summary["streaks"][name.lower()]
+                text = f"{name}: {days} day{'' if days == 1 else 's'}"
+                if days:
+                    text += f" (since {first_day})" if name == "Current" else f" ({first_day} to {last_day})"
+                labels[name].configure(text=text)
+            labels["records"].configure(text="\n".join(
+                f"{workout_type}: {duration} min, {calories} kcal"
+                for workout_type, duration, calories in summary["records"]) or "None yet")
+        
+        def refresh_stats():
+            # Every number comes from trigger-maintained tables, so this stays a
+            # few index lookups however long the history is.
+            self.async_data.call(stats.summary, callback=show_stats, key=f"stats-{id(stats_window)}")
+        
+        refresh_btn = ctk.CTkButton(stats_card, text="Refresh", font=self.base_font,
+                                    fg_color="#4646A6", hover_color="#3A3A8D", command=refresh_stats)
+        refresh_btn.grid(row=row, column=0, sticky="ew", padx=20, pady=20)
+        refresh_stats()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     app = FitnessTrackerApp()
     
     app.mainloop()
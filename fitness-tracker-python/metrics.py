@@ -0,0 +1,194 @@
+# metrics.py
+"""
+Low-overhead operation metrics: latency histograms, row and error counts,
+and a slow-query log with the query plan of every slow statement.
+
+Recording an operation costs two perf_counter calls, a bisect and a lock,
+a few microseconds, so the metrics stay on in normal use. A snapshot can be
+written as JSON or in the Prometheus text format at any time.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency buckets in seconds, from half a millisecond to ten seconds.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_PREFIX = "fitness_tracker"
+
+class Histogram:
+    """Latency distribution of one operation, with row and error counts."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the overflow (+Inf) bucket, not cumulative.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.errors = 0
+
+    def observe(self, seconds, rows=0, error=False):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.rows += rows
+        self.errors += error
+
+    def quantile(self, q):
+        """Estimate the q-quantile (0..1) as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "sum_seconds": self.total,
+            "max_seconds": self.max,
+            "p50_seconds": self.quantile(0.5),
+            "p99_seconds": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+class Timing:
+    """Handed out by Metrics.timer; set rows to record how many rows the operation touched."""
+    __slots__ = ("rows",)
+
+    def __init__(self):
+        self.rows = 0
+
+class Metrics:
+    def __init__(self, slow_query_seconds=0.1, slow_log_size=100):
+        """
+        Collect per-operation metrics. Safe to share between threads.
+
+        Parameters:
+            slow_query_seconds (float): Statements taking at least this long are
+                logged with their EXPLAIN QUERY PLAN. None disables the slow-query log.
+            slow_log_size (int): Number of recent slow queries kept for snapshots.
+        """
+        self.slow_query_seconds = slow_query_seconds
+        self.histograms = {}
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def observe(self, operation, seconds, rows=0, error=False):
+        """Record one run of operation."""
+        with self._lock:
+            histogram = self.histograms.get(operation)
+            if histogram is None:
+                histogram = self.histograms[operation] = Histogram()
+            histogram.observe(seconds, rows, error)
+
+    @contextmanager
+    def timer(self, operation, sql=None, params=(), connection=None):
+        """
+        Time the block as one run of operation.
+
+        If sql and connection are given and the block is slower than
+        slow_query_seconds, the statement is added to the slow-query log with
+        its query plan. An exception is counted as an error and re-raised.
+
+        Yields:
+            Timing: Set its rows attribute to record the rows read or written.
+        """
+        timing = Timing()
+        start = time.perf_counter()
+        try:
+            yield timing
+        except Exception:
+            self.observe(operation, time.perf_counter() - start, timing.rows, error=True)
+            raise
+        seconds = time.perf_counter() - start
+        self.observe(operation, seconds, timing.rows)
+        if (sql is not None and self.slow_query_seconds is not None
+                and seconds >= self.slow_query_seconds):
+            self.record_slow_query(operation, sql, params, seconds, connection)
+
+    def record_slow_query(self, operation, sql, params, seconds, connection=None):
+        """Log a slow statement, with its EXPLAIN QUERY PLAN when a connection is given."""
+        plan = None
+        if connection is not None:
+            try:
+                plan = [row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            except Exception as e:
+                logger.debug("Could not explain slow query for %s: %s", operation, e)
+        sql = " ".join(sql.split())
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "operation": operation,
+            "seconds": seconds,
+            "sql": sql,
+            "plan": plan,
+        }
+        with self._lock:
+            self.slow_queries.append(entry)
+        logger.warning("Slow query in %s (%.1f ms): %s; plan: %s", operation, seconds * 1000, sql,
+                       " / ".join(plan) if plan else "unavailable")
+
+    def snapshot(self):
+        """Return every metric as a JSON-serializable dict."""
+        with self._lock:
+            return {
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "operations": {name: histogram.as_dict() for name, histogram in sorted(self.histograms.items())},
+                "slow_queries": list(self.slow_queries),
+            }
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        name = f"{PROMETHEUS_PREFIX}_operation"
+        lines = [
+            f"# HELP {name}_seconds Latency of tracker operations.",
+            f"# TYPE {name}_seconds histogram",
+        ]
+        snapshot = self.snapshot()["operations"]
+        for operation, data in snapshot.items():
+            label = f'operation="{operation}"'
+            for bound, count in data["buckets"].items():
+                lines.append(f'{name}_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f"{name}_seconds_sum{{{label}}} {data['sum_seconds']}")
+            lines.append(f"{name}_seconds_count{{{label}}} {data['count']}")
+        for metric, key, description in (("rows_total", "rows", "Rows read or written."),
+                                         ("errors_total", "errors", "Failed operations.")):
+            lines.append(f"# HELP {name}_{metric} {description}")
+            lines.append(f"# TYPE {name}_{metric} counter")
+            for operation, data in snapshot.items():
+                lines.append(f'{name}_{metric}{{operation="{operation}"}} {data[key]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Write a snapshot atomically: JSON if path ends in .json, Prometheus text otherwise
+        (e.g. a .prom file for the node exporter's textfile collector).
+        """
+        if path.endswith(".json"):
+            text = json.dumps(self.snapshot(), indent=2)
+        else:
+            text = self.to_prometheus()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
@@ -0,0 +1,596 @@
+# migrations.py
+"""
+Versioned schema migrations for the workouts database.
+
+The schema version lives in SQLite's PRAGMA user_version. Each migration runs
+in its own transaction together with the version bump, so an interrupted
+upgrade leaves the database at the last fully applied version.
+"""
+
+def _create_workouts(conn):
+    # The original schema, with dates stored as "%Y-%m-%d %H:%M:%S" text.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS workouts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            workout_type TEXT NOT NULL,
+            duration INTEGER NOT NULL,
+            calories INTEGER NOT NULL
+        )
+    """)
+
+def _reject_text_dates(conn):
+    # Move rows whose date is still text, i.e. one SQLite could not parse, out
+    # of workouts into rejected_workouts, where they are kept as they were for
+    # manual repair. Readers only ever see epoch seconds.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rejected_workouts (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            workout_type TEXT NOT NULL,
+            duration INTEGER NOT NULL,
+            calories INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        INSERT INTO rejected_workouts (id, date, workout_type, duration, calories)
+        SELECT id, date, workout_type, duration, calories FROM workouts WHERE typeof(date) != 'integer'
+    """)
+    conn.execute("DELETE FROM workouts WHERE typeof(date) != 'integer'")
+
+def _epoch_dates(conn):
+    # Rebuild the table with dates as integer epoch seconds. Text dates were
+    # written in local time, so they are converted with the 'utc' modifier.
+    # Dates SQLite cannot parse are moved to rejected_workouts.
+    conn.execute("""
+        CREATE TABLE workouts_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date INTEGER NOT NULL,
+            workout_type TEXT NOT NULL,
+            duration INTEGER NOT NULL,
+            calories INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        INSERT INTO workouts_new (id, date, workout_type, duration, calories)
+        SELECT id,
+               CASE WHEN typeof(date) = 'integer' THEN date
+                    ELSE COALESCE(CAST(strftime('%s', date, 'utc') AS INTEGER), date)
+               END,
+               workout_type, duration, calories
+        FROM workouts
+    """)
+    conn.execute("DROP TABLE workouts")
+    conn.execute("ALTER TABLE workouts_new RENAME TO workouts")
+    _reject_text_dates(conn)
+
+def _date_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_date ON workouts (date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_type_date ON workouts (workout_type, date)")
+
+def _sort_indexes(conn):
+    # Lets the workout table page through rows sorted by duration or calories
+    # without sorting the whole table for every page.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_duration ON workouts (duration)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_calories ON workouts (calories)")
+
+# Frozen copies of the rollup bucket definitions used by migration 5:
+# (period, local bucket start of a date expression, length of one bucket).
+_ROLLUP_PERIODS_V5 = (
+    ("day", "date({date}, 'unixepoch', 'localtime')", "+1 day"),
+    ("week", "date({date}, 'unixepoch', 'localtime', 'weekday 0', '-6 days')", "+7 days"),
+    ("month", "date({date}, 'unixepoch', 'localtime', 'start of month')", "+1 month"),
+)
+
+def _rollup_recompute_v5(row):
+    """Statements that recompute the rollup rows holding `row` (OLD or NEW) from the workouts table."""
+    statements = []
+    for period, bucket, length in _ROLLUP_PERIODS_V5:
+        bucket = bucket.format(date=f"{row}.date")
+        statements.append(f"""
+            DELETE FROM workout_rollups
+            WHERE period = '{period}' AND bucket = {bucket} AND workout_type = {row}.workout_type;
+            INSERT INTO workout_rollups
+            SELECT '{period}', {bucket}, {row}.workout_type, COUNT(*), SUM(calories), SUM(duration),
+                   MIN(duration), MAX(duration), MAX(calories)
+            FROM workouts
+            WHERE workout_type = {row}.workout_type
+              AND date >= CAST(strftime('%s', {bucket}, 'utc') AS INTEGER)
+              AND date < CAST(strftime('%s', {bucket}, '{length}', 'utc') AS INTEGER)
+            HAVING COUNT(*) > 0;""")
+    return "".join(statements)
+
+def _rollups(conn):
+    # Per day/week/month and workout type aggregates, kept exact by triggers so
+    # every write path (single, bulk or external) maintains them. Inserts add to
+    # the bucket; updates and deletes recompute the affected buckets with an
+    # index range scan, which keeps MIN/MAX exact.
+    # Databases migrated to version 2 before it rejected unparseable dates may
+    # still hold text dates, which have no bucket.
+    _reject_text_dates(conn)
+    conn.execute("""
+        CREATE TABLE workout_rollups (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            workout_type TEXT NOT NULL,
+            workout_count INTEGER NOT NULL,
+            total_calories INTEGER NOT NULL,
+            total_duration INTEGER NOT NULL,
+            min_duration INTEGER NOT NULL,
+            max_duration INTEGER NOT NULL,
+            max_calories INTEGER NOT NULL,
+            PRIMARY KEY (period, bucket, workout_type)
+        ) WITHOUT ROWID
+    """)
+    for period, bucket, _ in _ROLLUP_PERIODS_V5:
+        conn.execute(f"""
+            INSERT INTO workout_rollups
+            SELECT '{period}', {bucket.format(date="date")} AS bucket, workout_type, COUNT(*),
+                   SUM(calories), SUM(duration), MIN(duration), MAX(duration), MAX(calories)
+            FROM workouts
+            GROUP BY bucket, workout_type
+        """)
+    upserts = "".join(f"""
+            INSERT INTO workout_rollups
+            VALUES ('{period}', {bucket.format(date="NEW.date")}, NEW.workout_type, 1, NEW.calories,
+                    NEW.duration, NEW.duration, NEW.duration, NEW.calories)
+            ON CONFLICT (period, bucket, workout_type) DO UPDATE SET
+                workout_count = workout_count + 1,
+                total_calories = total_calories + excluded.total_calories,
+                total_duration = total_duration + excluded.total_duration,
+                min_duration = MIN(min_duration, excluded.min_duration),
+                max_duration = MAX(max_duration, excluded.max_duration),
+                max_calories = MAX(max_calories, excluded.max_calories);"""
+        for period, bucket, _ in _ROLLUP_PERIODS_V5)
+    # Bulk loads set db_state.bulk_load for the duration of their transaction
+    # and fold each chunk into the rollups with one grouped upsert instead.
+    conn.execute("CREATE TABLE db_state (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID")
+    conn.execute("INSERT INTO db_state VALUES ('bulk_load', 0)")
+    conn.execute(f"""
+        CREATE TRIGGER workouts_rollup_insert AFTER INSERT ON workouts
+        WHEN (SELECT value FROM db_state WHERE name = 'bulk_load') = 0
+        BEGIN {upserts} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER workouts_rollup_update
+        AFTER UPDATE OF date, workout_type, duration, calories ON workouts
+        BEGIN {_rollup_recompute_v5("OLD")} {_rollup_recompute_v5("NEW")} END
+    """)
+    conn.execute(f"CREATE TRIGGER workouts_rollup_delete AFTER DELETE ON workouts BEGIN {_rollup_recompute_v5('OLD')} END")
+
+def _rollup_recompute_v6(row):
+    """Like _rollup_recompute_v5, for the per-user rollups of migration 6."""
+    statements = []
+    for period, bucket, length in _ROLLUP_PERIODS_V5:
+        bucket = bucket.format(date=f"{row}.date")
+        statements.append(f"""
+            DELETE FROM workout_rollups
+            WHERE period = '{period}' AND user_id = {row}.user_id AND bucket = {bucket}
+              AND workout_type = {row}.workout_type;
+            INSERT INTO workout_rollups
+            SELECT '{period}', {row}.user_id, {bucket}, {row}.workout_type, COUNT(*), SUM(calories),
+                   SUM(duration), MIN(duration), MAX(duration), MAX(calories)
+            FROM workouts
+            WHERE user_id = {row}.user_id AND workout_type = {row}.workout_type
+              AND date >= CAST(strftime('%s', {bucket}, 'utc') AS INTEGER)
+              AND date < CAST(strftime('%s', {bucket}, '{length}', 'utc') AS INTEGER)
+            HAVING COUNT(*) > 0;""")
+    return "".join(statements)
+
+def _user_partitioning(conn):
+    # Add the user dimension. Existing workouts belong to user 0, the default
+    # user of a DataManager. Every read is scoped to one user, so each index
+    # leads with user_id and a user's queries never touch other users' rows;
+    # the unscoped indexes would only slow down writes and are dropped.
+    conn.execute("ALTER TABLE workouts ADD COLUMN user_id INTEGER NOT NULL DEFAULT 0")
+    for index in ("idx_workouts_date", "idx_workouts_type_date", "idx_workouts_duration", "idx_workouts_calories"):
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+    conn.execute("CREATE INDEX idx_workouts_user_date ON workouts (user_id, date)")
+    conn.execute("CREATE INDEX idx_workouts_user_type_date ON workouts (user_id, workout_type, date)")
+    conn.execute("CREATE INDEX idx_workouts_user_duration ON workouts (user_id, duration)")
+    conn.execute("CREATE INDEX idx_workouts_user_calories ON workouts (user_id, calories)")
+
+    # Rebuild the rollups per user, with triggers that include user_id.
+    for trigger in ("workouts_rollup_insert", "workouts_rollup_update", "workouts_rollup_delete"):
+        conn.execute(f"DROP TRIGGER {trigger}")
+    conn.execute("DROP TABLE workout_rollups")
+    conn.execute("""
+        CREATE TABLE workout_rollups (
+            period TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            workout_type TEXT NOT NULL,
+            workout_count INTEGER NOT NULL,
+            total_calories INTEGER NOT NULL,
+            total_duration INTEGER NOT NULL,
+            min_duration INTEGER NOT NULL,
+            max_duration INTEGER NOT NULL,
+            max_calories INTEGER NOT NULL,
+            PRIMARY KEY (period, user_id, bucket, workout_type)
+        ) WITHOUT ROWID
+    """)
+    for period, bucket, _ in _ROLLUP_PERIODS_V5:
+        conn.execute(f"""
+            INSERT INTO workout_rollups
+            SELECT '{period}', user_id, {bucket.format(date="date")} AS bucket, workout_type, COUNT(*),
+                   SUM(calories), SUM(duration), MIN(duration), MAX(duration), MAX(calories)
+            FROM workouts
+            GROUP BY user_id, bucket, workout_type
+        """)
+    upserts = "".join(f"""
+            INSERT INTO workout_rollups
+            VALUES ('{period}', NEW.user_id, {bucket.format(date="NEW.date")}, NEW.workout_type, 1,
+                    NEW.calories, NEW.duration, NEW.duration, NEW.duration, NEW.calories)
+            ON CONFLICT (period, user_id, bucket, workout_type) DO UPDATE SET
+                workout_count = workout_count + 1,
+                total_calories = total_calories + excluded.total_calories,
+                total_duration = total_duration + excluded.total_duration,
+                min_duration = MIN(min_duration, excluded.min_duration),
+                max_duration = MAX(max_duration, excluded.max_duration),
+                max_calories = MAX(max_calories, excluded.max_calories);"""
+        for period, bucket, _ in _ROLLUP_PERIODS_V5)
+    conn.execute(f"""
+        CREATE TRIGGER workouts_rollup_insert AFTER INSERT ON workouts
+        WHEN (SELECT value FROM db_state WHERE name = 'bulk_load') = 0
+        BEGIN {upserts} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER workouts_rollup_update
+        AFTER UPDATE OF date, workout_type, duration, calories, user_id ON workouts
+        BEGIN {_rollup_recompute_v6("OLD")} {_rollup_recompute_v6("NEW")} END
+    """)
+    conn.execute(f"CREATE TRIGGER workouts_rollup_delete AFTER DELETE ON workouts BEGIN {_rollup_recompute_v6('OLD')} END")
+
+# Frozen copy of vocabulary.DEFAULT_TYPES used by migration 7, so the default
+# types get the codes existing models were trained with.
+_DEFAULT_TYPES_V7 = ("Run", "Walk", "Strenght")
+
+def _rollup_recompute_v7(row):
+    """Like _rollup_recompute_v6, for the type_id rollups of migration 7."""
+    statements = []
+    for period, bucket, length in _ROLLUP_PERIODS_V5:
+        bucket = bucket.format(date=f"{row}.date")
+        statements.append(f"""
+            DELETE FROM workout_rollups
+            WHERE period = '{period}' AND user_id = {row}.user_id AND bucket = {bucket}
+              AND type_id = {row}.type_id;
+            INSERT INTO workout_rollups
+            SELECT '{period}', {row}.user_id, {bucket}, {row}.type_id, COUNT(*), SUM(calories),
+                   SUM(duration), MIN(duration), MAX(duration), MAX(calories)
+            FROM workouts
+            WHERE user_id = {row}.user_id AND type_id = {row}.type_id
+              AND date >= CAST(strftime('%s', {bucket}, 'utc') AS INTEGER)
+              AND date < CAST(strftime('%s', {bucket}, '{length}', 'utc') AS INTEGER)
+            HAVING COUNT(*) > 0;""")
+    return "".join(statements)
+
+def _workout_types(conn):
+    # Move workout type names into a dictionary table and store an integer
+    # code on every row. Codes are dense and append-only (0, 1, 2, ... in the
+    # order types first appeared), so they can be used directly as model
+    # features and array indexes. Rebuilding the table drops its indexes and
+    # triggers, which are created again for the new column.
+    conn.execute("""
+        CREATE TABLE workout_types (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.executemany("INSERT INTO workout_types (id, name) VALUES (?, ?)", enumerate(_DEFAULT_TYPES_V7))
+    for (name,) in conn.execute("""
+        SELECT workout_type FROM workouts
+        WHERE workout_type NOT IN (SELECT name FROM workout_types)
+        GROUP BY workout_type
+        ORDER BY MIN(id)
+    """).fetchall():
+        conn.execute("INSERT INTO workout_types (id, name) SELECT MAX(id) + 1, ? FROM workout_types", (name,))
+
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'workouts'").fetchone()
+    conn.execute("""
+        CREATE TABLE workouts_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date INTEGER NOT NULL,
+            type_id INTEGER NOT NULL REFERENCES workout_types (id),
+            duration INTEGER NOT NULL,
+            calories INTEGER NOT NULL,
+            user_id INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        INSERT INTO workouts_new (id, date, type_id, duration, calories, user_id)
+        SELECT workouts.id, date, workout_types.id, duration, calories, user_id
+        FROM workouts JOIN workout_types ON workout_types.name = workouts.workout_type
+    """)
+    conn.execute("DROP TABLE workouts")
+    conn.execute("ALTER TABLE workouts_new RENAME TO workouts")
+    if sequence is not None:
+        # Keep ids of deleted rows from being handed out again.
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'workouts'")
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('workouts', ?)", sequence)
+    conn.execute("CREATE INDEX idx_workouts_user_date ON workouts (user_id, date)")
+    conn.execute("CREATE INDEX idx_workouts_user_type_date ON workouts (user_id, type_id, date)")
+    conn.execute("CREATE INDEX idx_workouts_user_duration ON workouts (user_id, duration)")
+    conn.execute("CREATE INDEX idx_workouts_user_calories ON workouts (user_id, calories)")
+
+    conn.execute("DROP TABLE workout_rollups")
+    conn.execute("""
+        CREATE TABLE workout_rollups (
+            period TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            type_id INTEGER NOT NULL,
+            workout_count INTEGER NOT NULL,
+            total_calories INTEGER NOT NULL,
+            total_duration INTEGER NOT NULL,
+            min_duration INTEGER NOT NULL,
+            max_duration INTEGER NOT NULL,
+            max_calories INTEGER NOT NULL,
+            PRIMARY KEY (period, user_id, bucket, type_id)
+        ) WITHOUT ROWID
+    """)
+    for period, bucket, _ in _ROLLUP_PERIODS_V5:
+        conn.execute(f"""
+            INSERT INTO workout_rollups
+            SELECT '{period}', user_id, {bucket.format(date="date")} AS bucket, type_id, COUNT(*),
+                   SUM(calories), SUM(duration), MIN(duration), MAX(duration), MAX(calories)
+            FROM workouts
+            GROUP BY user_id, bucket, type_id
+        """)
+    upserts = "".join(f"""
+            INSERT INTO workout_rollups
+            VALUES ('{period}', NEW.user_id, {bucket.format(date="NEW.date")}, NEW.type_id, 1,
+                    NEW.calories, NEW.duration, NEW.duration, NEW.duration, NEW.calories)
+            ON CONFLICT (period, user_id, bucket, type_id) DO UPDATE SET
+                workout_count = workout_count + 1,
+                total_calories = total_calories + excluded.total_calories,
+                total_duration = total_duration + excluded.total_duration,
+                min_duration = MIN(min_duration, excluded.min_duration),
+                max_duration = MAX(max_duration, excluded.max_duration),
+                max_calories = MAX(max_calories, excluded.max_calories);"""
+        for period, bucket, _ in _ROLLUP_PERIODS_V5)
+    conn.execute(f"""
+        CREATE TRIGGER workouts_rollup_insert AFTER INSERT ON workouts
+        WHEN (SELECT value FROM db_state WHERE name = 'bulk_load') = 0
+        BEGIN {upserts} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER workouts_rollup_update
+        AFTER UPDATE OF date, type_id, duration, calories, user_id ON workouts
+        BEGIN {_rollup_recompute_v7("OLD")} {_rollup_recompute_v7("NEW")} END
+    """)
+    conn.execute(f"CREATE TRIGGER workouts_rollup_delete AFTER DELETE ON workouts BEGIN {_rollup_recompute_v7('OLD')} END")
+
+def _archive(conn):
+    # Catalog and rollup totals for archive.py. workout_rollups stays a
+    # summary of the hot table; the totals of archived rows move to
+    # archived_rollups, and all_rollups is the whole history. Archiving
+    # deletes whole ranges with db_state.archiving set, which skips the
+    # per-row rollup recompute (archive.py fixes the affected buckets once).
+    conn.execute("""
+        CREATE TABLE archive_partitions (
+            name TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            start INTEGER NOT NULL,
+            end INTEGER NOT NULL,
+            batch INTEGER NOT NULL,
+            rows INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE archived_rollups (
+            period TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            type_id INTEGER NOT NULL,
+            workout_count INTEGER NOT NULL,
+            total_calories INTEGER NOT NULL,
+            total_duration INTEGER NOT NULL,
+            min_duration INTEGER NOT NULL,
+            max_duration INTEGER NOT NULL,
+            max_calories INTEGER NOT NULL,
+            PRIMARY KEY (period, user_id, bucket, type_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE VIEW all_rollups AS
+        SELECT * FROM workout_rollups UNION ALL SELECT * FROM archived_rollups
+    """)
+    conn.execute("INSERT INTO db_state VALUES ('archiving', 0)")
+    conn.execute("DROP TRIGGER workouts_rollup_delete")
+    conn.execute(f"""
+        CREATE TRIGGER workouts_rollup_delete AFTER DELETE ON workouts
+        WHEN (SELECT value FROM db_state WHERE name = 'archiving') = 0
+        BEGIN {_rollup_recompute_v7('OLD')} END
+    """)
+
+def _streaks(conn):
+    # Runs of consecutive local days with at least one workout, per user, for
+    # stats.py. A day is active while it has a day rollup in all_rollups, so
+    # triggers on workout_rollups keep the runs exact: a day gaining its first
+    # rollup row merges the runs ending the day before and starting the day
+    # after, and a day losing its last one splits the run around it. Each is
+    # a handful of index lookups, however long the history. Archiving only
+    # moves rollups between tables, so the triggers skip it.
+    conn.execute("""
+        CREATE TABLE workout_streaks (
+            user_id INTEGER NOT NULL,
+            first_day TEXT NOT NULL,
+            last_day TEXT NOT NULL,
+            days INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_streaks_user_first_day ON workout_streaks (user_id, first_day)")
+    conn.execute("CREATE INDEX idx_streaks_user_last_day ON workout_streaks (user_id, last_day)")
+    conn.execute("CREATE INDEX idx_streaks_user_days ON workout_streaks (user_id, days)")
+    # Consecutive days share julianday(day) - their rank within the user.
+    conn.execute("""
+        INSERT INTO workout_streaks (user_id, first_day, last_day, days)
+        SELECT user_id, MIN(bucket), MAX(bucket), COUNT(*)
+        FROM (
+            SELECT user_id, bucket,
+                   julianday(bucket) - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY bucket) AS island
+            FROM (SELECT DISTINCT user_id, bucket FROM all_rollups WHERE period = 'day')
+        )
+        GROUP BY user_id, island
+    """)
+    conn.execute("""
+        CREATE TRIGGER rollups_streak_insert AFTER INSERT ON workout_rollups
+        WHEN NEW.period = 'day' AND (SELECT value FROM db_state WHERE name = 'archiving') = 0
+          AND (SELECT COUNT(*) FROM all_rollups
+               WHERE period = 'day' AND user_id = NEW.user_id AND bucket = NEW.bucket) = 1
+        BEGIN
+            INSERT INTO workout_streaks (user_id, first_day, last_day, days)
+            SELECT NEW.user_id, first_day, last_day,
+                   CAST(julianday(last_day) - julianday(first_day) AS INTEGER) + 1
+            FROM (SELECT
+                COALESCE((SELECT first_day FROM workout_streaks
+                          WHERE user_id = NEW.user_id AND last_day = date(NEW.bucket, '-1 day')), NEW.bucket) AS first_day,
+                COALESCE((SELECT last_day FROM workout_streaks
+                          WHERE user_id = NEW.user_id AND first_day = date(NEW.bucket, '+1 day')), NEW.bucket) AS last_day);
+            DELETE FROM workout_streaks
+            WHERE user_id = NEW.user_id
+              AND (last_day = date(NEW.bucket, '-1 day') OR first_day = date(NEW.bucket, '+1 day'));
+        END
+    """)
+    # Runs never overlap, so the first run ending on or after a day is the
+    # only one that can contain it.
+    containing = """
+        SELECT rowid, first_day, last_day FROM workout_streaks
+        WHERE user_id = OLD.user_id AND last_day >= OLD.bucket AND first_day <= OLD.bucket
+        ORDER BY last_day LIMIT 1
+    """
+    conn.execute(f"""
+        CREATE TRIGGER rollups_streak_delete AFTER DELETE ON workout_rollups
+        WHEN OLD.period = 'day' AND (SELECT value FROM db_state WHERE name = 'archiving') = 0
+          AND NOT EXISTS (SELECT 1 FROM all_rollups
+                          WHERE period = 'day' AND user_id = OLD.user_id AND bucket = OLD.bucket)
+        BEGIN
+            INSERT INTO workout_streaks (user_id, first_day, last_day, days)
+            SELECT OLD.user_id, first_day, date(OLD.bucket, '-1 day'),
+                   CAST(julianday(OLD.bucket) - julianday(first_day) AS INTEGER)
+            FROM ({containing}) WHERE first_day < OLD.bucket;
+            INSERT INTO workout_streaks (user_id, first_day, last_day, days)
+            SELECT OLD.user_id, date(OLD.bucket, '+1 day'), last_day,
+                   CAST(julianday(last_day) - julianday(OLD.bucket) AS INTEGER)
+            FROM ({containing}) WHERE last_day > OLD.bucket;
+            DELETE FROM workout_streaks WHERE rowid = (SELECT rowid FROM ({containing}));
+        END
+    """)
+
+def _feature_store(conn):
+    # Model features per workout for features.py. The table keeps its own copy
+    # of each workout's columns, so it also covers archived workouts. New rows
+    # are found by id (db_state.features_last_id); updates and deletes are
+    # queued in feature_changes by the triggers below, so a refresh knows
+    # which users to recompute and from which date. Archiving deletes rows
+    # without changing them, so it is not queued. The table starts empty; the
+    # first features.refresh_features fills it.
+    conn.execute("""
+        CREATE TABLE workout_features (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            date INTEGER NOT NULL,
+            type_id INTEGER NOT NULL,
+            duration INTEGER NOT NULL,
+            calories INTEGER NOT NULL,
+            prev_type_1 INTEGER,
+            prev_type_2 INTEGER,
+            prev_type_3 INTEGER,
+            prev_duration INTEGER,
+            prev_calories INTEGER,
+            seconds_since_previous INTEGER,
+            calories_7d INTEGER,
+            workouts_7d INTEGER,
+            day_of_week INTEGER,
+            hour INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX idx_features_user_date ON workout_features (user_id, date)")
+    conn.execute("CREATE INDEX idx_features_date ON workout_features (date)")
+    conn.execute("""
+        CREATE TABLE feature_changes (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            date INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT INTO db_state VALUES ('features_last_id', 0)")
+    conn.execute("""
+        CREATE TRIGGER workouts_features_update
+        AFTER UPDATE OF date, type_id, duration, calories, user_id ON workouts
+        BEGIN
+            INSERT INTO feature_changes VALUES (OLD.id, OLD.user_id, OLD.date), (NEW.id, NEW.user_id, NEW.date);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER workouts_features_delete AFTER DELETE ON workouts
+        WHEN (SELECT value FROM db_state WHERE name = 'archiving') = 0
+        BEGIN
+            INSERT INTO feature_changes VALUES (OLD.id, OLD.user_id, OLD.date);
+        END
+    """)
+
+def _date_checks(conn):
+    # Every date bucket expression is NULL for a date that is not epoch
+    # seconds, so such writes are refused before any trigger buckets them.
+    for event in ("INSERT", "UPDATE OF date"):
+        name = event.split()[0].lower()
+        conn.execute(f"""
+            CREATE TRIGGER workouts_check_date_{name} BEFORE {event} ON workouts
+            WHEN typeof(NEW.date) != 'integer'
+            BEGIN
+                SELECT RAISE(ABORT, 'workout date must be integer epoch seconds');
+            END
+        """)
+
+# (version, description, function) in the order they must be applied.
+MIGRATIONS = [
+    (1, "Create workouts table", _create_workouts),
+    (2, "Store workout dates as integer epoch seconds", _epoch_dates),
+    (3, "Index workouts by date and by (workout_type, date)", _date_indexes),
+    (4, "Index workouts by duration and calories for sorted paging", _sort_indexes),
+    (5, "Add trigger-maintained day/week/month rollups", _rollups),
+    (6, "Add workouts.user_id with per-user indexes and rollups", _user_partitioning),
+    (7, "Store workout types as codes into a workout_types table", _workout_types),
+    (8, "Add the archive partition catalog and archived rollups", _archive),
+    (9, "Add trigger-maintained workout streaks", _streaks),
+    (10, "Add the workout_features feature store", _feature_store),
+    (11, "Refuse workout dates that are not epoch seconds", _date_checks),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    """Return the schema version recorded in the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, target=LATEST_VERSION):
+    """
+    Upgrade the database in place to the target schema version.
+
+    Parameters:
+        conn (sqlite3.Connection): Connection to the database to upgrade.
+        target (int): Version to stop at. Defaults to the latest.
+
+    Returns:
+        list: Versions that were applied, in order.
+    """
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version > target:
+            break
+        if version <= schema_version(conn):
+            continue
+        # BEGIN IMMEDIATE takes the write lock up front, so a second process
+        # starting at the same time waits and then sees the new version.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version > schema_version(conn):
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
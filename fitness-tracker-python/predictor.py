@@ -0,0 +1,71 @@
+# predictor.py
+from collections import OrderedDict
+import numpy as np
+from features import FEATURES
+
+# Feature vectors whose predictions are remembered.
+MEMO_SIZE = 4096
+# Features that move with the clock, and the step they are rounded down to
+# in the memo key. Without it the time since the previous workout would
+# make every refresh a new key; hour and day_of_week already change slowly
+# enough.
+ROUNDED_FEATURES = {"seconds_since_previous": 900}
+
+class NextExercisePredictor:
+    """
+    Memoized inference for a next-exercise model.
+
+    The model takes the feature store's features (see features.py), with
+    workout types as vocabulary codes; features.next_features builds them for
+    the user's next workout. Predictions are memoized by the vector with the
+    clock-driven features rounded down to the steps in ROUNDED_FEATURES, so
+    the key only changes when a workout is logged or a step, the hour or the
+    day passes, and refreshing the window in between is a dictionary lookup.
+    The model itself always gets the raw features, as in training; within a
+    step, the first prediction is reused. A predictor belongs to one
+    model: hot-swapping the model means creating a new predictor, or calling
+    invalidate() after changing it.
+    """
+    def __init__(self, model, vocabulary, memo_size=MEMO_SIZE):
+        self.model = model
+        self.vocabulary = vocabulary
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._rounding = [(FEATURES.index(name), step) for name, step in ROUNDED_FEATURES.items()]
+
+    def invalidate(self):
+        """Drop every cached prediction."""
+        self._memo.clear()
+
+    def _rounded(self, values):
+        values = list(values)
+        for position, step in self._rounding:
+            # Negative values mark missing history and stay as they are.
+            if values[position] > 0:
+                values[position] -= values[position] % step
+        return values
+
+    def predict(self, values):
+        """Return the predicted next type code for one feature vector."""
+        key = tuple(self._rounded(values))
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+        code = int(self.model.predict(np.array([values], dtype=np.float32))[0])
+        self._memo[key] = code
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+        return code
+
+    def predict_name(self, values, default="Run"):
+        """Return the predicted next workout type name for one feature vector."""
+        return self.vocabulary.decode(self.predict(values), default)
+
+    def predict_many(self, X):
+        """
+        Predict the next type code for many feature vectors at once, e.g. a whole history.
+
+        Returns:
+            numpy.ndarray: Predicted type codes, one per row of X.
+        """
+        return self.model.predict(np.asarray(X, dtype=np.float32)).astype(np.int64)
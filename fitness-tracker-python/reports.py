@@ -0,0 +1,278 @@
+# reports.py
+"""
+Headless batch rendering of the Data Analysis charts.
+
+Renders the same four charts as the Data Analysis window (charts.AnalysisCharts)
+with the Agg backend, one image per user, period, bucket and workout type
+("all" plus every type logged in the period). The periods are the whole
+history and every calendar year and month with workouts; each is grouped by
+the buckets in PERIODS:
+
+    reports/
+        manifest.json
+        user-1/
+            all/      day-all.png  week-all.png  month-all.png  day-type1-Run.png ...
+            2024/     week-all.png  month-all.png ...
+            2024-03/  day-all.png  week-all.png ...
+
+Every user and period is a task for a process pool. Each worker keeps one
+database connection and one figure, which it updates in place for every
+report like the window does. Every report is keyed on a digest of the data it shows
+(the analytics.analysis_data result) plus the output options; the keys of
+the last run are kept in manifest.json, so a report whose data has not
+changed is skipped without being drawn. Whole-history data comes from the
+rollups and a year or month only reads that range, so checking an unchanged
+report costs a few small queries.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from analytics import BUCKETS
+
+FORMATS = ("png", "svg")
+MANIFEST_FILE = "manifest.json"
+# Bump when the chart layout changes, so every cached report is redrawn.
+CHART_VERSION = 1
+# Kinds of report period and the buckets each is grouped by.
+PERIODS = {
+    "all": ("day", "week", "month"),
+    "year": ("week", "month"),
+    "month": ("day", "week"),
+}
+
+def report_path(user_id, period, bucket, type_code=None, workout_type=None, image_format="png"):
+    """
+    Path of a report relative to the output directory.
+
+    period is "all", a year as "YYYY" or a month as "YYYY-MM". A workout
+    type's file is named by its type code, which keeps it apart from the
+    all-types report and from types whose names only differ in characters
+    a file name cannot hold; the name is only there for people.
+    """
+    if type_code is None:
+        name = "all"
+    else:
+        name = f"type{type_code}-" + re.sub(r"[^\w.-]+", "_", workout_type)
+    return os.path.join(f"user-{user_id}", period, f"{bucket}-{name}.{image_format}")
+
+def report_periods(months, periods=tuple(PERIODS)):
+    """
+    The report periods with workouts.
+
+    Parameters:
+        months (iterable): (month start as "YYYY-MM-DD", type code) pairs, as
+            in the month rollups.
+        periods (tuple): PERIODS keys to include.
+
+    Returns:
+        dict: (kind, name, start, end) -> set of the type codes logged in the
+        period. start and end are local datetimes, end exclusive, or None
+        for the whole history.
+    """
+    windows = {}
+    for month, code in months:
+        first = date.fromisoformat(month)
+        keys = []
+        if "all" in periods:
+            keys.append(("all", "all", None, None))
+        if "year" in periods:
+            keys.append(("year", f"{first.year}", datetime(first.year, 1, 1), datetime(first.year + 1, 1, 1)))
+        if "month" in periods:
+            keys.append(("month", f"{first.year}-{first.month:02}", datetime(first.year, first.month, 1),
+                         datetime(first.year + first.month // 12, first.month % 12 + 1, 1)))
+        for key in keys:
+            windows.setdefault(key, set()).add(code)
+    return windows
+
+def report_key(data, image_format, dpi):
+    """Digest of everything a report image depends on."""
+    payload = json.dumps([CHART_VERSION, image_format, dpi, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def report_users(data_manager):
+    """Every user with workouts, archived ones included, in id order."""
+    return [user_id for user_id, in data_manager.query("reports.users", """
+        SELECT DISTINCT user_id FROM all_rollups WHERE period = 'month' ORDER BY user_id
+    """)]
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _save_manifest(output_dir, manifest):
+    # Replaced atomically, like the model checkpoints.
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+# Per-process state of a worker, set up once by _init_worker.
+_worker = {}
+
+def _init_worker(db_file, output_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    from tracker import DataManager
+    _worker["data_manager"] = DataManager(db_file)
+    _worker["output_dir"] = output_dir
+
+def _charts():
+    # Built on first use, so a worker that only finds cached reports never
+    # imports the plotting stack's figure machinery.
+    if "charts" not in _worker:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from charts import AnalysisCharts
+        charts = AnalysisCharts()
+        FigureCanvasAgg(charts.figure)
+        _worker["charts"] = charts
+    return _worker["charts"]
+
+def _render_period(task):
+    """
+    Render the reports of one user and period whose keys differ from the previous run.
+
+    Returns:
+        tuple: ({report path: key} for every report of the period, number of
+        reports drawn).
+    """
+    import analytics
+    user_id, (kind, name, start, end), workout_types, buckets, image_formats, dpi, previous = task
+    data_manager = _worker["data_manager"].for_user(user_id)
+    output_dir = _worker["output_dir"]
+    title = "whole history" if kind == "all" else name
+    keys, rendered = {}, 0
+    for type_code, workout_type in workout_types:
+        for bucket in PERIODS[kind]:
+            if bucket not in buckets:
+                continue
+            data = analytics.analysis_data(data_manager, workout_type=workout_type, bucket=bucket,
+                                           start=start, end=end)
+            for image_format in image_formats:
+                path = report_path(user_id, name, bucket, type_code, workout_type, image_format)
+                key = report_key(data, image_format, dpi)
+                keys[path] = key
+                if previous.get(path) == key and os.path.exists(os.path.join(output_dir, path)):
+                    continue
+                charts = _charts()
+                charts.update(data)
+                charts.figure.suptitle(f"User {user_id}: {workout_type or 'All workouts'} by {bucket}, {title}",
+                                       fontsize=16)
+                os.makedirs(os.path.dirname(os.path.join(output_dir, path)), exist_ok=True)
+                # Written under a temporary name, so an interrupted run never
+                # leaves a truncated image behind a valid manifest entry.
+                tmp_path = os.path.join(output_dir, f"{path}.tmp")
+                charts.figure.savefig(tmp_path, format=image_format, dpi=dpi)
+                os.replace(tmp_path, os.path.join(output_dir, path))
+                rendered += 1
+    return keys, rendered
+
+def render_reports(db_file, output_dir, users=None, periods=tuple(PERIODS), buckets=tuple(BUCKETS),
+                   image_formats=("png",), dpi=100, max_workers=None, force=False, report=None):
+    """
+    Render every report that changed since the last run into output_dir.
+
+    Every user and period is a separate task, so one user with a long
+    history is spread over the pool too.
+
+    Parameters:
+        db_file (str): Source database.
+        output_dir (str): Where the reports and manifest.json go.
+        users (list): User ids, or None for every user with workouts.
+        periods (tuple): Kinds of report period; PERIODS keys.
+        buckets (tuple): Buckets to group the calories chart by, where the
+            period allows it; BUCKETS keys.
+        image_formats (tuple): "png" and/or "svg".
+        dpi (int): Resolution of the images.
+        max_workers (int): Worker processes. Defaults to the number of CPUs.
+        force (bool): Redraw every report, even unchanged ones.
+        report (callable): Called with a line per user, or None.
+
+    Returns:
+        dict: "reports", "rendered" and "skipped" counts and "seconds" taken.
+    """
+    for period in periods:
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period '{period}'. Use one of: {', '.join(PERIODS)}")
+    for bucket in buckets:
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket '{bucket}'. Use one of: {', '.join(BUCKETS)}")
+    for image_format in image_formats:
+        if image_format not in FORMATS:
+            raise ValueError(f"Unknown format '{image_format}'. Use one of: {', '.join(FORMATS)}")
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+    tasks = []
+    # Opening the database here also migrates it once, before the workers start.
+    from tracker import DataManager
+    with DataManager(db_file) as data_manager:
+        if users is None:
+            users = report_users(data_manager)
+        for user_id in users:
+            months = data_manager.query("reports.months", """
+                SELECT bucket, type_id FROM all_rollups WHERE period = 'month' AND user_id = ?
+            """, (user_id,))
+            for window, codes in sorted(report_periods(months, periods).items(), key=lambda item: item[0][:2]):
+                prefix = os.path.join(f"user-{user_id}", window[1], "")
+                previous = {} if force else {path: key for path, key in manifest.items()
+                                             if path.startswith(prefix)}
+                workout_types = [(None, None)] + sorted(((code, data_manager.type_name(code)) for code in codes),
+                                                        key=lambda item: item[1])
+                tasks.append((user_id, window, workout_types, tuple(buckets), tuple(image_formats), dpi,
+                              previous))
+
+    total = rendered = 0
+    # Per user: [reports, rendered, periods left], for one report line when a user is done.
+    progress = {}
+    for user_id, *_ in tasks:
+        progress.setdefault(user_id, [0, 0, 0])[2] += 1
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(db_file, output_dir)) as pool:
+        for (user_id, *_), (keys, period_rendered) in zip(tasks, pool.map(_render_period, tasks)):
+            manifest.update(keys)
+            total += len(keys)
+            rendered += period_rendered
+            user = progress[user_id]
+            user[0] += len(keys)
+            user[1] += period_rendered
+            user[2] -= 1
+            if report and user[2] == 0:
+                report(f"user {user_id}: {user[1]} of {user[0]} reports rendered")
+    _save_manifest(output_dir, manifest)
+    return {"reports": total, "rendered": rendered, "skipped": total - rendered,
+            "seconds": time.perf_counter() - start}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the Data Analysis charts to image files, per user, "
+                                                 "workout type and period.")
+    parser.add_argument("--db", default="workouts.db", help="Database file (default: workouts.db).")
+    parser.add_argument("--output", default="reports", help="Output directory (default: reports).")
+    parser.add_argument("--user", type=int, action="append",
+                        help="Render this user's reports; may be repeated (default: every user).")
+    parser.add_argument("--period", action="append", choices=list(PERIODS),
+                        help="Report over the whole history, each year or each month; "
+                             "may be repeated (default: all three).")
+    parser.add_argument("--bucket", action="append", choices=list(BUCKETS),
+                        help="Bucket to group by; may be repeated (default: all).")
+    parser.add_argument("--format", action="append", choices=FORMATS,
+                        help="Image format; may be repeated (default: png).")
+    parser.add_argument("--dpi", type=int, default=100, help="Image resolution (default: 100).")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--force", action="store_true", help="Redraw every report, even unchanged ones.")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary.")
+    args = parser.parse_args()
+
+    summary = render_reports(args.db, args.output, users=args.user, periods=args.period or tuple(PERIODS),
+                             buckets=args.bucket or tuple(BUCKETS),
+                             image_formats=args.format or ("png",), dpi=args.dpi, max_workers=args.workers,
+                             force=args.force, report=None if args.quiet else print)
+    print(f"{summary['rendered']} of {summary['reports']} reports rendered, {summary['skipped']} unchanged, "
+          f"in {summary['seconds']:.1f}s.")
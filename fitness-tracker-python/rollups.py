@@ -0,0 +1,157 @@
+# rollups.py
+"""
+Verify and rebuild the workout_rollups table.
+
+The rollups are kept exact by triggers on the workouts table (see
+migrations.py). This module recomputes them from scratch, which is useful
+after restoring a backup or editing the database with external tools.
+workout_rollups only covers the hot table; the totals of archived workouts
+live in archived_rollups (see archive.py), which is not recomputed here.
+"""
+import argparse
+from analytics import BUCKETS
+
+ROLLUP_COLUMNS = ("period, user_id, bucket, type_id, workout_count, total_calories, total_duration, "
+                  "min_duration, max_duration, max_calories")
+
+def _rollups_sql(period, where="", source="workouts"):
+    """A SELECT computing the rollup rows of one period from the workouts matching `where`."""
+    return f"""
+        SELECT '{period}' AS period, user_id, {BUCKETS[period]} AS bucket, type_id,
+               COUNT(*) AS workout_count, SUM(calories) AS total_calories,
+               SUM(duration) AS total_duration, MIN(duration) AS min_duration,
+               MAX(duration) AS max_duration, MAX(calories) AS max_calories
+        FROM {source}
+        {where}
+        GROUP BY user_id, bucket, type_id
+    """
+
+def _expected_rollups_sql():
+    """A SELECT producing what workout_rollups should contain, computed from the workouts table."""
+    return " UNION ALL ".join(_rollups_sql(period) for period in BUCKETS)
+
+def add_to_rollups(conn, after_id):
+    """
+    Fold workouts with id > after_id into workout_rollups with one grouped upsert per period.
+
+    Used by bulk loads, which insert with the per-row rollup trigger disabled
+    (see migrations.py) and must call this inside the same transaction.
+    """
+    for period in BUCKETS:
+        # NOT INDEXED keeps the planner on the rowid range: otherwise it may
+        # pick a user_id index for the GROUP BY and scan the whole table for
+        # every chunk, however few rows it holds.
+        conn.execute(f"""
+            INSERT INTO workout_rollups ({ROLLUP_COLUMNS})
+            {_rollups_sql(period, "WHERE id > ?", source="workouts NOT INDEXED")}
+            ON CONFLICT (period, user_id, bucket, type_id) DO UPDATE SET
+                workout_count = workout_count + excluded.workout_count,
+                total_calories = total_calories + excluded.total_calories,
+                total_duration = total_duration + excluded.total_duration,
+                min_duration = MIN(min_duration, excluded.min_duration),
+                max_duration = MAX(max_duration, excluded.max_duration),
+                max_calories = MAX(max_calories, excluded.max_calories)
+        """, (after_id,))
+
+def archive_rollups(conn, where, params):
+    """
+    Add the totals of the workouts matching `where` to archived_rollups.
+
+    Called by archive.py in the transaction that moves those workouts out of
+    the hot table, before deleting them. The rollup keys they touch are kept
+    in temp.rollup_keys for recompute_rollups.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS rollup_keys "
+                 "(period TEXT, user_id INTEGER, bucket TEXT, type_id INTEGER)")
+    conn.execute("DELETE FROM temp.rollup_keys")
+    for period in BUCKETS:
+        conn.execute(f"""
+            INSERT INTO archived_rollups ({ROLLUP_COLUMNS})
+            {_rollups_sql(period, where)}
+            ON CONFLICT (period, user_id, bucket, type_id) DO UPDATE SET
+                workout_count = workout_count + excluded.workout_count,
+                total_calories = total_calories + excluded.total_calories,
+                total_duration = total_duration + excluded.total_duration,
+                min_duration = MIN(min_duration, excluded.min_duration),
+                max_duration = MAX(max_duration, excluded.max_duration),
+                max_calories = MAX(max_calories, excluded.max_calories)
+        """, params)
+        conn.execute(f"""
+            INSERT INTO temp.rollup_keys
+            SELECT period, user_id, bucket, type_id FROM ({_rollups_sql(period, where)})
+        """, params)
+
+def recompute_rollups(conn, where, params):
+    """
+    Recompute the workout_rollups rows recorded by archive_rollups from the
+    workouts matching `where`, which must cover every bucket they belong to.
+    """
+    conn.execute("""
+        DELETE FROM workout_rollups
+        WHERE (period, user_id, bucket, type_id) IN (SELECT * FROM temp.rollup_keys)
+    """)
+    for period in BUCKETS:
+        conn.execute(f"""
+            INSERT INTO workout_rollups ({ROLLUP_COLUMNS})
+            SELECT * FROM ({_rollups_sql(period, where)})
+            WHERE (period, user_id, bucket, type_id) IN (SELECT * FROM temp.rollup_keys)
+        """, params)
+
+def verify_rollups(data_manager):
+    """
+    Compare workout_rollups against a full recomputation.
+
+    Parameters:
+        data_manager (DataManager): Database to check.
+
+    Returns:
+        list: (period, user_id, bucket, type_id) keys that are missing,
+        stale or should not exist. Empty when the rollups are exact.
+    """
+    expected = _expected_rollups_sql()
+    rows = data_manager.connection.execute(f"""
+        SELECT period, user_id, bucket, type_id FROM (
+            SELECT * FROM ({expected}) EXCEPT SELECT {ROLLUP_COLUMNS} FROM workout_rollups
+        )
+        UNION
+        SELECT period, user_id, bucket, type_id FROM (
+            SELECT {ROLLUP_COLUMNS} FROM workout_rollups EXCEPT SELECT * FROM ({expected})
+        )
+        ORDER BY 1, 2, 3, 4
+    """).fetchall()
+    return rows
+
+def rebuild_rollups(data_manager):
+    """
+    Recompute workout_rollups from the workouts table in a single transaction.
+
+    Parameters:
+        data_manager (DataManager): Database to repair.
+
+    Returns:
+        int: Number of rollup rows written.
+    """
+    conn = data_manager.connection
+    with conn:
+        conn.execute("DELETE FROM workout_rollups")
+        cursor = conn.execute(f"INSERT INTO workout_rollups ({ROLLUP_COLUMNS}) {_expected_rollups_sql()}")
+    return cursor.rowcount
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify and repair the workout rollup tables.")
+    parser.add_argument("--db", default="workouts.db", help="Database file (default: workouts.db).")
+    parser.add_argument("--verify-only", action="store_true", help="Report differences without repairing.")
+    args = parser.parse_args()
+
+    from tracker import DataManager
+    with DataManager(args.db) as data_manager:
+        mismatches = verify_rollups(data_manager)
+        for period, user_id, bucket, type_id in mismatches:
+            print(f"Mismatch: {period} user {user_id} {bucket} {data_manager.type_name(type_id)}")
+        if not mismatches:
+            print("Rollups are up to date.")
+        elif args.verify_only:
+            print(f"{len(mismatches)} rollup rows differ.")
+        else:
+            rows = rebuild_rollups(data_manager)
+            print(f"Rebuilt rollups: {rows} rows.")
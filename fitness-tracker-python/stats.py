@@ -0,0 +1,141 @@
+# stats.py
+"""
+Running statistics: moving averages, workout streaks and personal records.
+
+Nothing here scans the workouts table. Every number is read from state that
+triggers update as each workout is logged, edited or deleted (see
+migrations.py), so the cost of a call does not grow with the history:
+
+- moving averages add up at most one day rollup per day and type in the window;
+- streaks are the runs of consecutive active days kept in workout_streaks;
+- personal records are the per-type maxima of the month rollups.
+
+Archived workouts (see archive.py) are included. Every query is scoped to the
+DataManager's user, and days are local calendar days like the rollup buckets.
+"""
+import argparse
+from datetime import date, timedelta
+
+# Moving average windows, in days.
+WINDOWS = (7, 30)
+
+def moving_averages(data_manager, windows=WINDOWS, today=None):
+    """
+    Average calories and minutes of exercise per day over the last days.
+
+    Each window ends with today and includes it; days without a workout count
+    as zero.
+
+    Parameters:
+        data_manager (DataManager): Source database.
+        windows (tuple): Window lengths in days.
+        today (datetime.date): Last day of the windows. Defaults to today.
+
+    Returns:
+        dict: Window length -> {"workouts": count, "calories": calories per day,
+        "duration": minutes per day}.
+    """
+    today = today or date.today()
+    first_day = today - timedelta(days=max(windows) - 1)
+    rows = data_manager.query("stats.moving_averages", """
+        SELECT bucket, SUM(workout_count), SUM(total_calories), SUM(total_duration)
+        FROM all_rollups
+        WHERE period = 'day' AND user_id = ? AND bucket BETWEEN ? AND ?
+        GROUP BY bucket
+    """, (data_manager.user_id, first_day.isoformat(), today.isoformat()))
+    averages = {}
+    for days in windows:
+        start = (today - timedelta(days=days - 1)).isoformat()
+        in_window = [row for row in rows if row[0] >= start]
+        averages[days] = {
+            "workouts": sum(row[1] for row in in_window),
+            "calories": sum(row[2] for row in in_window) / days,
+            "duration": sum(row[3] for row in in_window) / days,
+        }
+    return averages
+
+def streaks(data_manager, today=None):
+    """
+    Current and longest streaks of consecutive days with at least one workout.
+
+    The current streak is still alive on a day without a workout so far, as
+    long as there was one the day before.
+
+    Parameters:
+        data_manager (DataManager): Source database.
+        today (datetime.date): Defaults to today.
+
+    Returns:
+        dict: "current" and "longest", each a (days, first day, last day)
+        tuple with days as "YYYY-MM-DD", or (0, None, None) if there is none.
+    """
+    today = today or date.today()
+    yesterday = (today - timedelta(days=1)).isoformat()
+    current = data_manager.query("stats.current_streak", """
+        SELECT first_day, last_day FROM workout_streaks
+        WHERE user_id = ? AND last_day >= ? AND first_day <= ?
+        ORDER BY last_day LIMIT 1
+    """, (data_manager.user_id, yesterday, today.isoformat()))
+    longest = data_manager.query("stats.longest_streak", """
+        SELECT days, first_day, last_day FROM workout_streaks
+        WHERE user_id = ?
+        ORDER BY days DESC, last_day DESC LIMIT 1
+    """, (data_manager.user_id,))
+    result = {"current": (0, None, None), "longest": longest[0] if longest else (0, None, None)}
+    if current:
+        first_day, last_day = current[0]
+        # Workouts logged ahead of time do not extend today's streak.
+        last_day = min(last_day, today.isoformat())
+        days = (date.fromisoformat(last_day) - date.fromisoformat(first_day)).days + 1
+        result["current"] = (days, first_day, last_day)
+    return result
+
+def personal_records(data_manager):
+    """
+    Longest workout and most calories burned in one workout, per workout type.
+
+    Returns:
+        list: (workout_type, max_duration, max_calories) tuples ordered by type.
+    """
+    rows = data_manager.query("stats.personal_records", """
+        SELECT type_id, MAX(max_duration), MAX(max_calories)
+        FROM all_rollups
+        WHERE period = 'month' AND user_id = ?
+        GROUP BY type_id
+    """, (data_manager.user_id,))
+    return sorted((data_manager.type_name(code), duration, calories) for code, duration, calories in rows)
+
+def summary(data_manager, today=None):
+    """
+    Everything the Statistics panel shows, in one call.
+
+    Returns:
+        dict: "averages" from moving_averages, "streaks" from streaks and
+        "records" from personal_records.
+    """
+    with data_manager.metrics.timer("stats.summary"):
+        return {
+            "averages": moving_averages(data_manager, today=today),
+            "streaks": streaks(data_manager, today=today),
+            "records": personal_records(data_manager),
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print moving averages, streaks and personal records.")
+    parser.add_argument("--db", default="workouts.db", help="Database file (default: workouts.db).")
+    parser.add_argument("--user", type=int, help="User id (default: the default user).")
+    args = parser.parse_args()
+
+    from tracker import DataManager
+    with DataManager(args.db) as data_manager:
+        if args.user is not None:
+            data_manager = data_manager.for_user(args.user)
+        stats = summary(data_manager)
+    for days, average in stats["averages"].items():
+        print(f"Last {days} days: {average['workouts']} workouts, {average['calories']:.0f} kcal/day, "
+              f"{average['duration']:.1f} min/day")
+    for name in ("current", "longest"):
+        days, first_day, last_day = stats["streaks"][name]
+        print(f"{name.capitalize()} streak: {days} days" + (f" ({first_day} to {last_day})" if days else ""))
+    for workout_type, duration, calories in stats["records"]:
+        print(f"{workout_type}: longest {duration} min, most {calories} kcal")
@@ -0,0 +1,90 @@
+# synthetic.py
+import argparse
+import time
+import numpy as np
+from tracker import DataManager, to_epoch
+
+# Share of each workout type in generated histories.
+DEFAULT_MIX = {"Run": 0.5, "Walk": 0.3, "Strenght": 0.2}
+# (mean duration in minutes, calories per minute) per type; unknown types use FALLBACK_PROFILE.
+TYPE_PROFILES = {"Run": (35, 11.0), "Walk": (45, 4.5), "Strenght": (50, 6.0)}
+FALLBACK_PROFILE = (40, 7.0)
+DEFAULT_START = "2020-01-01"
+DEFAULT_DAYS = 5 * 365
+
+def generate_workouts(rows, mix=None, start=DEFAULT_START, days=DEFAULT_DAYS, seed=0, chunk_size=100000):
+    """
+    Yield a deterministic synthetic workout history in date order.
+
+    The same arguments always produce the same rows, so benchmark databases
+    can be rebuilt identically. Rows are produced one chunk at a time, so
+    memory stays flat up to 10^7 rows and beyond.
+
+    Parameters:
+        rows (int): Number of workouts to generate.
+        mix (dict): Workout type -> relative weight. Defaults to DEFAULT_MIX.
+        start: First date, anything to_epoch accepts.
+        days (int): Length of the history; rows are spread evenly over it.
+        seed (int): Random seed.
+        chunk_size (int): Rows generated per NumPy batch.
+
+    Yields:
+        tuple: (date, workout_type, duration, calories) with epoch-second dates.
+    """
+    mix = DEFAULT_MIX if mix is None else mix
+    names = list(mix)
+    weights = np.array([mix[name] for name in names], dtype=float)
+    weights /= weights.sum()
+    profiles = np.array([TYPE_PROFILES.get(name, FALLBACK_PROFILE) for name in names], dtype=float)
+    start = to_epoch(start)
+    spacing = days * 86400 / max(rows, 1)
+
+    for offset in range(0, rows, chunk_size):
+        count = min(chunk_size, rows - offset)
+        # One generator per chunk, seeded by its position, so any chunk can be
+        # reproduced without generating the ones before it.
+        rng = np.random.default_rng([seed, offset])
+        index = np.arange(offset, offset + count)
+        # One row per slot of the evenly divided span, at a random time inside it.
+        dates = start + ((index + rng.random(count)) * spacing).astype(np.int64)
+        codes = rng.choice(len(names), size=count, p=weights)
+        durations = np.maximum(1, rng.gamma(4.0, profiles[codes, 0] / 4.0)).astype(np.int64)
+        calories = np.maximum(1, durations * profiles[codes, 1] * rng.normal(1.0, 0.15, count)).astype(np.int64)
+        yield from zip(dates.tolist(), [names[code] for code in codes], durations.tolist(), calories.tolist())
+
+def parse_mix(text):
+    """Parse a "Run=5,Walk=3,Swim=1" type mix into a dict."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight) if weight else 1.0
+    return mix
+
+def build_database(db_file, rows, mix=None, start=DEFAULT_START, days=DEFAULT_DAYS, seed=0, chunk_size=50000):
+    """
+    Append a synthetic history to db_file through DataManager.log_workouts_bulk.
+
+    Returns:
+        tuple: (rows written, elapsed seconds)
+    """
+    began = time.perf_counter()
+    with DataManager(db_file) as data_manager:
+        written = data_manager.log_workouts_bulk(
+            generate_workouts(rows, mix=mix, start=start, days=days, seed=seed),
+            chunk_size=chunk_size
+        )
+    return written, time.perf_counter() - began
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill a database with a synthetic workout history.")
+    parser.add_argument("--db", required=True, help="Database file to create or append to.")
+    parser.add_argument("--rows", type=int, default=100000, help="Number of workouts (default: 100000).")
+    parser.add_argument("--mix", type=parse_mix, help='Type mix, e.g. "Run=5,Walk=3,Strenght=2".')
+    parser.add_argument("--start", default=DEFAULT_START, help=f"First date (default: {DEFAULT_START}).")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help=f"History length in days (default: {DEFAULT_DAYS}).")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+    args = parser.parse_args()
+
+    rows, seconds = build_database(args.db, args.rows, mix=args.mix, start=args.start,
+                                   days=args.days, seed=args.seed)
+    print(f"Wrote {rows} workouts to {args.db} in {seconds:.2f}s ({rows / max(seconds, 1e-9):,.0f} rows/s).")
@@ -0,0 +1,72 @@
+# test_importer.py
+"""
+Tests for importing workouts, and for the dates the database refuses: the
+importer stops at a date it cannot parse, migrating an old database moves
+such dates to rejected_workouts, and the date triggers refuse text dates
+written around DataManager.
+
+    python -m pytest test_importer.py
+"""
+import sqlite3
+import pytest
+from importer import import_file
+from tracker import DataManager
+
+def test_import_csv_and_jsonl(tmp_path):
+    csv_file = tmp_path / "workouts.csv"
+    csv_file.write_text("timestamp,activity,minutes,kcal\n"
+                        "2024-05-01 07:30:00,Run,30,300\n"
+                        "2024-05-02T18:00:00,Swim,45,400\n"
+                        "1714700000,Walk,20,100\n", encoding="utf-8")
+    jsonl_file = tmp_path / "workouts.jsonl"
+    jsonl_file.write_text('{"date": "2024-05-04 08:00:00", "type": "Run", "duration": 25, "calories": 250}\n'
+                          '\n'
+                          '{"start_time": 1714900000, "workout_type": "Yoga", "duration_min": 60, "kcal": 150}\n',
+                          encoding="utf-8")
+    with DataManager(str(tmp_path / "workouts.db")) as data_manager:
+        assert import_file(str(csv_file), data_manager, report=None)[0] == 3
+        assert import_file(str(jsonl_file), data_manager, chunk_size=1, report=None)[0] == 2
+        workouts = data_manager.get_past_workouts()
+        assert sorted(row[2] for row in workouts) == ["Run", "Run", "Swim", "Walk", "Yoga"]
+        assert all(isinstance(row[1], int) for row in workouts)
+
+def test_import_stops_at_an_unparseable_date(tmp_path):
+    csv_file = tmp_path / "workouts.csv"
+    csv_file.write_text("date,workout_type,duration,calories\n"
+                        "2024-05-01 07:30:00,Run,30,300\n"
+                        "2024-05-02 07:30:00,Run,30,300\n"
+                        "2024-05-03 07:30:00,Run,30,300\n"
+                        "yesterday,Run,30,300\n"
+                        "2024-05-05 07:30:00,Run,30,300\n", encoding="utf-8")
+    with DataManager(str(tmp_path / "workouts.db")) as data_manager:
+        # Chunks before the bad row are committed; its chunk and later ones are not.
+        assert import_file(str(csv_file), data_manager, chunk_size=2, report=None)[0] == 2
+        assert len(data_manager.get_past_workouts()) == 2
+
+def test_migration_moves_unparseable_dates_to_rejected_workouts(tmp_path):
+    db_file = str(tmp_path / "workouts.db")
+    conn = sqlite3.connect(db_file)
+    # The original schema, before any migration.
+    conn.execute("""
+        CREATE TABLE workouts (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL,
+                               workout_type TEXT NOT NULL, duration INTEGER NOT NULL,
+                               calories INTEGER NOT NULL)
+    """)
+    conn.executemany("INSERT INTO workouts (date, workout_type, duration, calories) VALUES (?, ?, ?, ?)",
+                     [("2024-05-01 07:30:00", "Run", 30, 300), ("01/05/2024", "Walk", 20, 100),
+                      ("2024-05-02 07:30:00", "Swim", 45, 400)])
+    conn.commit()
+    conn.close()
+
+    with DataManager(db_file) as data_manager:
+        assert sorted(row[2] for row in data_manager.get_past_workouts()) == ["Run", "Swim"]
+        assert data_manager.query("test.rejected", "SELECT id, date, workout_type FROM rejected_workouts") == [
+            (2, "01/05/2024", "Walk")]
+        conn = data_manager.connection
+        # Writes around DataManager cannot bring a text date back.
+        with pytest.raises(sqlite3.IntegrityError, match="epoch seconds"):
+            with conn:
+                conn.execute("INSERT INTO workouts (date, type_id, duration, calories) VALUES ('today', 0, 1, 1)")
+        with pytest.raises(sqlite3.IntegrityError, match="epoch seconds"):
+            with conn:
+                conn.execute("UPDATE workouts SET date = '2024-05-01' WHERE id = 1")
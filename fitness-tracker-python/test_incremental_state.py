@@ -0,0 +1,124 @@
+# test_incremental_state.py
+"""
+Regression test for the state that triggers and incremental refreshes keep up
+to date: the rollups, the workout streaks and the feature store. After writes
+through every path (bulk loads, single inserts, updates, deletes, external
+date edits) and archiving, each must equal a recompute from scratch.
+
+    python -m pytest test_incremental_state.py
+"""
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+import archive
+import features
+from rollups import verify_rollups
+from tracker import DataManager
+
+TYPES = ("Run", "Walk", "Swim", "Strength")
+FIRST_DAY = datetime(2023, 1, 1, 6, 0)
+DAYS = 500
+
+def _workouts(rng, count, first_day=FIRST_DAY, days=DAYS):
+    # Few enough days that active days form streaks with gaps between them.
+    return [(first_day + timedelta(days=rng.randrange(days), minutes=rng.randrange(16 * 60)),
+             rng.choice(TYPES), rng.randint(10, 120), rng.randint(50, 900)) for _ in range(count)]
+
+def _raw_workouts(data_manager):
+    # (user_id, date, type_id, duration, calories) of the hot table and every partition.
+    return [row for rows in data_manager.query_all(
+        "test.workouts", "SELECT user_id, date, type_id, duration, calories FROM workouts") for row in rows]
+
+def _expected_rollups(workouts):
+    rollups = {}
+    for user_id, date, type_id, duration, calories in workouts:
+        day = datetime.fromtimestamp(date).date()
+        buckets = {"day": day, "week": day - timedelta(days=day.weekday()), "month": day.replace(day=1)}
+        for period, bucket in buckets.items():
+            key = (period, user_id, bucket.isoformat(), type_id)
+            count, total_calories, total_duration, low, high, most = rollups.get(
+                key, (0, 0, 0, duration, duration, calories))
+            rollups[key] = (count + 1, total_calories + calories, total_duration + duration,
+                            min(low, duration), max(high, duration), max(most, calories))
+    return rollups
+
+def _expected_streaks(workouts):
+    days = defaultdict(set)
+    for user_id, date, *_ in workouts:
+        days[user_id].add(datetime.fromtimestamp(date).date())
+    streaks = []
+    for user_id, active in days.items():
+        active = sorted(active)
+        first = active[0]
+        for previous, day in zip(active, active[1:] + [None]):
+            if day is None or day - previous != timedelta(days=1):
+                streaks.append((user_id, first.isoformat(), previous.isoformat(), (previous - first).days + 1))
+                first = day
+    return sorted(streaks)
+
+def _assert_consistent(data_manager):
+    assert verify_rollups(data_manager) == []
+    workouts = _raw_workouts(data_manager)
+    rollups = data_manager.query("test.rollups", """
+        SELECT period, user_id, bucket, type_id, SUM(workout_count), SUM(total_calories),
+               SUM(total_duration), MIN(min_duration), MAX(max_duration), MAX(max_calories)
+        FROM all_rollups
+        GROUP BY period, user_id, bucket, type_id
+    """)
+    assert {tuple(row[:4]): tuple(row[4:]) for row in rollups} == _expected_rollups(workouts)
+
+    streaks = data_manager.query("test.streaks", """
+        SELECT user_id, first_day, last_day, days FROM workout_streaks ORDER BY user_id, first_day
+    """)
+    assert streaks == _expected_streaks(workouts)
+
+    conn = data_manager.connection
+    select_features = "SELECT * FROM workout_features ORDER BY id"
+    features.refresh_features(conn)
+    refreshed = conn.execute(select_features).fetchall()
+    features.refresh_features(conn, rebuild=True)
+    assert refreshed == conn.execute(select_features).fetchall()
+    assert len(refreshed) == len(workouts)
+
+def test_incremental_state_matches_recompute(tmp_path):
+    rng = random.Random(7)
+    with DataManager(str(tmp_path / "workouts.db")) as data_manager:
+        other = data_manager.for_user(1)
+        # Chunks of 200 take the grouped rollup upserts, the last chunk of 40
+        # and the small load the per-row triggers.
+        data_manager.log_workouts_bulk(_workouts(rng, 440), chunk_size=200)
+        other.log_workouts_bulk(_workouts(rng, 10))
+        for date, workout_type, duration, calories in _workouts(rng, 20):
+            other.log_workout(workout_type, duration, calories, date)
+        features.refresh_features(data_manager.connection)
+        _assert_consistent(data_manager)
+
+        def hot_ids(count):
+            ids = [workout_id for workout_id, in data_manager.query("test.ids", "SELECT id FROM workouts")]
+            return rng.sample(ids, count)
+
+        for workout_id in hot_ids(30):
+            data_manager.update_workout(workout_id, rng.choice(TYPES), rng.randint(10, 120), rng.randint(50, 900))
+        # Moving dates merges and splits streaks. DataManager never changes a
+        # date, so these are external writes.
+        conn = data_manager.connection
+        with conn:
+            for workout_id in hot_ids(30):
+                conn.execute("UPDATE workouts SET date = date + ? WHERE id = ?",
+                             (rng.choice((-3, -1, 1, 2, 40)) * 86400, workout_id))
+        for workout_id in hot_ids(60):
+            data_manager.delete_workout(workout_id)
+        _assert_consistent(data_manager)
+
+        archive.archive_workouts(data_manager, datetime(2024, 1, 1), directory=str(tmp_path / "archive"))
+        assert data_manager.partitions()
+        _assert_consistent(data_manager)
+
+        # Late entries into the archived year, and changes to the hot rows.
+        for date, workout_type, duration, calories in _workouts(rng, 15, days=365):
+            data_manager.log_workout(workout_type, duration, calories, date)
+        for workout_id in hot_ids(20):
+            data_manager.delete_workout(workout_id)
+        for workout_id in hot_ids(10):
+            data_manager.update_workout(workout_id, rng.choice(TYPES), rng.randint(10, 120), rng.randint(50, 900))
+        _assert_consistent(data_manager)
@@ -0,0 +1,46 @@
+# test_reports.py
+"""
+Tests for the report renderer's manifest: unchanged reports are skipped,
+changed ones redrawn, and every report has its own file.
+
+    python -m pytest test_reports.py
+"""
+import json
+import os
+from datetime import datetime
+import reports
+from tracker import DataManager
+
+def _render(db_file, output_dir, **options):
+    return reports.render_reports(db_file, output_dir, periods=("all", "month"), buckets=("day",),
+                                  dpi=20, max_workers=1, **options)
+
+def test_manifest_skips_unchanged_reports(tmp_path):
+    db_file, output_dir = str(tmp_path / "workouts.db"), str(tmp_path / "reports")
+    with DataManager(db_file) as data_manager:
+        # "all" is a type name too, and two names differ only in characters a
+        # file name cannot hold.
+        for day, workout_type in enumerate(["Run", "all", "Run/Fast", "Run Fast"], start=1):
+            data_manager.log_workout(workout_type, 30, 300, datetime(2024, 3, day, 7))
+        data_manager.log_workout("Run", 40, 350, datetime(2024, 4, 2, 7))
+
+    # Whole history: all four types plus "all"; March: the same; April: Run plus "all".
+    first = _render(db_file, output_dir)
+    assert first["reports"] == first["rendered"] == 12
+    with open(os.path.join(output_dir, reports.MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert len(manifest) == 12
+    assert all(os.path.exists(os.path.join(output_dir, path)) for path in manifest)
+
+    again = _render(db_file, output_dir)
+    assert (again["rendered"], again["skipped"]) == (0, 12)
+
+    with DataManager(db_file) as data_manager:
+        data_manager.log_workout("Run", 50, 500, datetime(2024, 4, 3, 7))
+    # Only the reports showing April's Run workouts change: the whole
+    # history's Run and "all" reports, and April's two.
+    changed = _render(db_file, output_dir)
+    assert (changed["reports"], changed["rendered"]) == (12, 4)
+
+    os.remove(os.path.join(output_dir, reports.report_path(0, "2024-03", "day")))
+    assert _render(db_file, output_dir)["rendered"] == 1
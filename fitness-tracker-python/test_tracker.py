@@ -0,0 +1,101 @@
+# test_tracker.py
+"""
+Tests for DataManager reads across archive partitions, per-thread connections
+and ShardedDataManager routing.
+
+    python -m pytest test_tracker.py
+"""
+import random
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+import pytest
+import archive
+from tracker import DataManager, ShardedDataManager, sort_key
+
+TYPES = ("Run", "Walk", "Swim")
+
+def _load(data_manager, count, seed=3):
+    # Three years of workouts, so yearly archiving leaves two partitions.
+    rng = random.Random(seed)
+    first_day = datetime(2022, 1, 1)
+    data_manager.log_workouts_bulk([(first_day + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60)),
+                                     rng.choice(TYPES), rng.randint(10, 120), rng.randint(50, 900))
+                                    for _ in range(count)])
+
+def _pages(data_manager, page_size, **options):
+    rows, after = [], None
+    while True:
+        page = data_manager.get_workouts_page(after=after, page_size=page_size, **options)
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        after = sort_key(page[-1], options.get("order_by", "date"))
+
+def test_keyset_paging_across_archive_partitions(tmp_path):
+    with DataManager(str(tmp_path / "workouts.db")) as data_manager:
+        _load(data_manager, 300)
+        newest_first = sorted(data_manager.iter_workouts(), key=sort_key, reverse=True)
+        assert len(newest_first) == 300
+
+        archive.archive_workouts(data_manager, datetime(2024, 1, 1), directory=str(tmp_path / "archive"))
+        assert len(data_manager.partitions()) == 2
+        assert data_manager.query("test.hot", "SELECT COUNT(*) FROM workouts")[0][0] < 150
+
+        # Page sizes that end pages inside a partition and right at its edge.
+        for page_size in (7, 50, 1000):
+            assert _pages(data_manager, page_size) == newest_first
+            assert _pages(data_manager, page_size, descending=False) == newest_first[::-1]
+        assert list(data_manager.iter_workouts(page_size=9)) == newest_first
+
+        by_calories = sorted(newest_first, key=lambda row: sort_key(row, "calories"))
+        assert _pages(data_manager, 11, order_by="calories", descending=False) == by_calories
+
+        # A range across the 2022/2023 boundary, filtered by type.
+        start, end = datetime(2022, 10, 1), datetime(2023, 3, 1)
+        expected = [row for row in newest_first
+                    if start.timestamp() <= row[1] < end.timestamp() and row[2] == "Swim"]
+        assert expected
+        assert _pages(data_manager, 5, start=start, end=end, workout_type="Swim") == expected
+
+def test_thread_connections_close_when_the_thread_exits(tmp_path):
+    with DataManager(str(tmp_path / "workouts.db")) as data_manager:
+        opened = []
+
+        def read():
+            opened.append(data_manager.connection)
+            data_manager.get_past_workouts()
+        for _ in range(5):
+            thread = threading.Thread(target=read)
+            thread.start()
+            thread.join()
+        for conn in opened:
+            with pytest.raises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+        assert sum(len(connections) for connections in data_manager._connections.values()) == 1
+
+def test_sharded_routing(tmp_path):
+    pattern = str(tmp_path / "workouts-{shard}.db")
+    with ShardedDataManager(pattern, shards=3) as sharded:
+        for user_id in range(9):
+            for _ in range(user_id + 1):
+                assert sharded.for_user(user_id).log_workout("Run", 30, 300)
+        for user_id in range(9):
+            assert sharded.shard_of(user_id) == user_id % 3
+            assert len(sharded.for_user(user_id).get_past_workouts()) == user_id + 1
+
+    # Every user's rows are in its own shard's file, and only there.
+    for shard in range(3):
+        conn = sqlite3.connect(pattern.format(shard=shard))
+        try:
+            users = dict(conn.execute("SELECT user_id, COUNT(*) FROM workouts GROUP BY user_id"))
+        finally:
+            conn.close()
+        assert users == {user_id: user_id + 1 for user_id in range(shard, 9, 3)}
+
+def test_sharded_rejects_a_shard_out_of_range(tmp_path):
+    sharded = ShardedDataManager(str(tmp_path / "workouts-{shard}.db"), shards=2,
+                                 partition=lambda user_id, shards: user_id)
+    with pytest.raises(ValueError):
+        sharded.for_user(5)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,79 @@
+# test_train_model.py
+"""
+Tests for train_incremental: models without partial_fit are refit as the same
+model once enough new workouts arrive, and models with it learn just those.
+
+    python -m pytest test_train_model.py
+"""
+import random
+from datetime import datetime, timedelta
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.naive_bayes import GaussianNB
+import train_model
+from tracker import DataManager
+from vocabulary import WorkoutVocabulary
+
+TYPES = ("Run", "Walk", "Swim")
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    # The vocabulary file is saved in the working directory.
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "workouts.db")
+
+def _log(db_file, count, types=TYPES, seed=0):
+    rng = random.Random(seed)
+    with DataManager(db_file) as data_manager:
+        last = data_manager.query("test.last", "SELECT MAX(date) FROM workouts")[0][0]
+        day = datetime.fromtimestamp(last) if last is not None else datetime(2024, 1, 1, 7)
+        workouts = []
+        for _ in range(count):
+            day += timedelta(hours=rng.randint(10, 40))
+            workouts.append((day, rng.choice(types), rng.randint(10, 120), rng.randint(50, 900)))
+        data_manager.log_workouts_bulk(workouts)
+
+def test_refit_keeps_the_model_family_and_metadata(db_file):
+    model_file = "model.pkl"
+    _log(db_file, 200)
+    checkpoint = train_model.train_full(db_file, model_file)
+    assert checkpoint["training_rows"] == 200
+    # As if train_search had picked a non-default forest.
+    X, y = train_model.fetch_training_data(db_file, WorkoutVocabulary(checkpoint["vocabulary"]))
+    checkpoint["model"] = RandomForestClassifier(n_estimators=20, max_depth=4, random_state=1).fit(X, y)
+    checkpoint["metadata"] = {"family": "random_forest", "training_rows": 200}
+    train_model.save_model(checkpoint, model_file)
+
+    # Fewer new workouts than REFIT_FRACTION of the training rows: nothing to do yet.
+    _log(db_file, 5, seed=1)
+    assert train_model.train_incremental(db_file, model_file) is None
+    assert train_model.load_model(model_file)["last_id"] == checkpoint["last_id"]
+
+    _log(db_file, 10, seed=2)
+    refit = train_model.train_incremental(db_file, model_file)
+    model = refit["model"]
+    assert isinstance(model, RandomForestClassifier)
+    assert model.get_params() == checkpoint["model"].get_params()
+    assert refit["training_rows"] == 215
+    assert refit["last_id"] > checkpoint["last_id"]
+    assert refit["metadata"]["family"] == "random_forest"
+    assert refit["metadata"]["training_rows"] == 215
+    assert train_model.load_model(model_file)["last_id"] == refit["last_id"]
+
+def test_partial_fit_learns_only_new_workouts(db_file):
+    model_file = "model.pkl"
+    _log(db_file, 100)
+    checkpoint = train_model.train_full(db_file, model_file, incremental=True)
+    assert isinstance(checkpoint["model"], GaussianNB)
+
+    _log(db_file, 3, seed=1)
+    updated = train_model.train_incremental(db_file, model_file)
+    assert updated["training_rows"] == 103
+    assert updated["model"].class_count_.sum() == 103
+
+    # A type the model has no class for makes it refit, still as a GaussianNB.
+    _log(db_file, 3, types=("Yoga",), seed=2)
+    refit = train_model.train_incremental(db_file, model_file)
+    assert isinstance(refit["model"], GaussianNB)
+    assert "Yoga" in refit["vocabulary"]
+    assert refit["training_rows"] == 106
@@ -0,0 +1,82 @@
+# test_write_buffer.py
+"""
+Tests for the write-behind buffer, on its own and behind DataManager.log_workout.
+
+    python -m pytest test_write_buffer.py
+"""
+import sqlite3
+import threading
+from write_buffer import WriteBuffer
+from tracker import DataManager
+
+def _count(db_file):
+    # Through a separate connection, so only committed rows are seen.
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM workouts").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_committed_returns_after_commit(tmp_path):
+    db_file = str(tmp_path / "workouts.db")
+    with DataManager(db_file, write_buffer_size=100, durability="committed") as data_manager:
+        for count in range(1, 6):
+            assert data_manager.log_workout("Run", 30, 300)
+            assert _count(db_file) == count
+
+def test_queued_is_flushed_before_reads_and_on_close(tmp_path):
+    db_file = str(tmp_path / "workouts.db")
+    data_manager = DataManager(db_file, write_buffer_size=1000, durability="queued", flush_interval=0.5)
+    for _ in range(50):
+        assert data_manager.log_workout("Walk", 20, 100)
+    # The flusher is still waiting for its batch to grow; a read flushes it.
+    assert len(data_manager.get_past_workouts()) == 50
+    for _ in range(25):
+        data_manager.log_workout("Walk", 20, 100)
+    data_manager.close()
+    assert _count(db_file) == 75
+
+def test_full_queue_drops_the_write():
+    started, release = threading.Event(), threading.Event()
+    written = []
+
+    def write_batch(rows):
+        started.set()
+        release.wait()
+        written.extend(rows)
+
+    buffer = WriteBuffer(write_batch, max_size=1, put_timeout=0.05)
+    assert buffer.put(1)
+    # The flusher holds the first row; the second fills the queue.
+    assert started.wait(5)
+    assert buffer.put(2)
+    assert not buffer.put(3)
+    assert buffer.pending == 2
+    release.set()
+    assert buffer.flush(timeout=5)
+    buffer.close()
+    assert written == [1, 2]
+    assert buffer.pending == 0
+
+def test_failed_batch_is_retried_row_by_row():
+    written = []
+
+    def write_batch(rows):
+        if "bad" in rows:
+            raise ValueError("bad row")
+        written.extend(rows)
+
+    buffer = WriteBuffer(write_batch, flush_interval=0.2)
+    results = {}
+
+    def put(row):
+        results[row] = buffer.put(row, wait=True)
+    # Concurrent waiting puts share one batch, which fails as a whole.
+    threads = [threading.Thread(target=put, args=(row,)) for row in ("a", "bad", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    buffer.close()
+    assert sorted(written) == ["a", "b"]
+    assert results == {"a": True, "bad": False, "b": True}
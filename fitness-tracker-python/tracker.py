@@ -1,119 +1,731 @@
+import atexit
+import copy
+import logging
 import sqlite3
+import threading
+import weakref
 from datetime import datetime
+from itertools import islice
+import archive
+from metrics import Metrics
+from migrations import migrate
+from rollups import add_to_rollups
+from vocabulary import WorkoutVocabulary
+from write_buffer import WriteBuffer
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+# When a buffered log_workout returns: once the row is queued, or once its batch is committed.
+DURABILITY_LEVELS = ("queued", "committed")
+INSERT_SQL = """
+    INSERT INTO workouts (date, type_id, duration, calories, user_id)
+    VALUES (?, ?, ?, ?, ?)
+"""
+# Smallest batch whose rollups are folded in with grouped upserts instead of
+# the per-row trigger; below it the fixed cost of the grouped upserts is
+# higher than the trigger's, as with the small batches of the write buffer.
+BULK_ROLLUP_MIN_ROWS = 16
+# The user a DataManager works for unless told otherwise; single-user databases only have this one.
+DEFAULT_USER = 0
+
+class _ThreadConnections:
+    """The connections one thread opened through a DataManager, held in its thread-local."""
+    def __init__(self):
+        self.conn = None
+        # Archive partition path -> (connection, batch it was opened at).
+        self.archives = {}
+        # Every open connection above, shared with DataManager._connections.
+        self.opened = []
+
+def _close_connections(lock, registry, key):
+    # Finalizer of a _ThreadConnections: its thread has exited, or the
+    # DataManager was garbage collected.
+    with lock:
+        connections = registry.pop(key, [])
+    for conn in connections:
+        try:
+            conn.close()
+        except Exception:
+            logger.exception("Error closing connection")
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+WORKOUT_FIELDS = ("date", "workout_type", "duration", "calories")
+# Position of each column in the (id, date, workout_type, duration, calories) rows returned by reads.
+# Rows carry the type's name where the table stores its code, type_id.
+ROW_INDEX = {"id": 0, "date": 1, "workout_type": 2, "type_id": 2, "duration": 3, "calories": 4}
+# Keyset used for each sortable column. Every key ends in id so it is unique, and
+# each matches an index so paging in that order is an index range scan. Sorting
+# by type orders by type code, which groups each type's workouts together.
+SORT_KEYS = {
+    "date": ("date", "id"),
+    "workout_type": ("type_id", "date", "id"),
+    "duration": ("duration", "id"),
+    "calories": ("calories", "id"),
+}
+
+def to_epoch(value):
+    """
+    Convert a workout timestamp to the stored integer epoch seconds.
+
+    Parameters:
+        value: A datetime, epoch seconds (int/float or digit string) or an
+            ISO-8601 string such as "2024-05-01 07:30:00" or "2024-05-01T07:30:00".
+            Naive datetimes and strings are taken as local time.
+
+    Returns:
+        int: Seconds since the epoch.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, datetime):
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp())
+
+def parse_date(value):
+    """Convert a stored workout date, in epoch seconds, to a local datetime."""
+    return datetime.fromtimestamp(value)
+
+def format_date(value):
+    """Format a stored workout date, in epoch seconds, as DATE_FORMAT."""
+    return datetime.fromtimestamp(value).strftime(DATE_FORMAT)
+
+def sort_key(row, order_by="date"):
+    """Return the keyset of a workout row for the given sort column, for use as `after`."""
+    return tuple(row[ROW_INDEX[column]] for column in SORT_KEYS[order_by])
+
+def _workout_row(workout):
+    """Turn a (date, workout_type, duration, calories) tuple or dict into an insert row."""
+    if isinstance(workout, dict):
+        workout = [workout[field] for field in WORKOUT_FIELDS]
+    date, workout_type, duration, calories = workout
+    return (to_epoch(date), workout_type, int(duration), int(calories))
 
 class DataManager:
-    def __init__(self, db_file='workouts.db'):
+    def __init__(self, db_file='workouts.db', journal_mode="WAL", synchronous="NORMAL",
+                 cached_statements=128, timeout=5.0, metrics=None, write_buffer_size=0,
+                 flush_interval=0.0, durability="committed", user_id=DEFAULT_USER):
+        """
+        Create a DataManager backed by long-lived SQLite connections.
+
+        Each thread gets its own connection, opened on first use and reused for
+        every later call, so the connect cost is paid once per thread instead of
+        once per query. It is closed when the thread exits or on close().
+
+        Parameters:
+            db_file (str): Path to the SQLite database file.
+            journal_mode (str): SQLite journal mode. "WAL" lets readers (such as the
+                analysis window) run while a write is in progress.
+            synchronous (str): SQLite synchronous level. "NORMAL" is durable in WAL
+                mode except for the last commits on power loss.
+            cached_statements (int): Size of the per-connection prepared-statement cache.
+            timeout (float): Seconds to wait on a locked database before failing.
+            metrics (Metrics): Where operation timings and slow queries are recorded.
+                A new Metrics with the default slow-query threshold if omitted.
+            write_buffer_size (int): If positive, log_workout goes through a
+                write-behind buffer of this many rows that commits a batch of
+                queued workouts per transaction (see write_buffer.py). 0 writes
+                every workout in its own transaction. The buffer pays off with
+                concurrent writers; a single thread logging one workout at a time
+                in "committed" mode only adds a thread handoff per workout.
+            flush_interval (float): Seconds the buffer waits to grow a batch. With
+                the default 0, each batch is whatever queued up while the previous
+                one was committing, which batches more the higher the load.
+            durability (str): With the buffer, "committed" makes log_workout wait
+                until its batch is committed; "queued" returns as soon as the row
+                is queued, so rows still queued are lost if the process dies.
+                Either way, the buffer is flushed before every read, update,
+                delete and bulk load, and on close and at interpreter exit.
+            user_id (int): The user whose workouts every method reads and writes.
+                Use for_user() to serve other users over the same connections.
+        """
+        journal_mode = journal_mode.upper() if journal_mode else None
+        synchronous = synchronous.upper() if synchronous else None
+        if journal_mode is not None and journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Unknown journal mode: {journal_mode}")
+        if synchronous is not None and synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown synchronous level: {synchronous}")
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability: {durability}")
         self.db_file = db_file
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._local = threading.local()
+        # id(_ThreadConnections) -> its opened list, for close().
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.durability = durability
+        self.user_id = user_id
+        # Cache of the workout_types table; shared with for_user() views.
+        self._types = WorkoutVocabulary([])
+        self._types_lock = threading.Lock()
         self.init_db()
-    
+        self._write_buffer = None
+        if write_buffer_size > 0:
+            self._write_buffer = WriteBuffer(self._write_batch, max_size=write_buffer_size,
+                                             flush_interval=flush_interval, put_timeout=timeout)
+            atexit.register(self.flush)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _connect(self):
+        """Open a new connection and apply the configured pragmas."""
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=self.timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+        if self.journal_mode:
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        if self.synchronous:
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        return conn
+
+    def _thread_connections(self):
+        """
+        The calling thread's _ThreadConnections.
+
+        Only the thread-local refers to it, so when the thread exits it is
+        collected and its finalizer closes the thread's connections; short-lived
+        threads such as pool workers do not leave theirs open until close().
+        """
+        if self._closed:
+            raise sqlite3.ProgrammingError("DataManager has been closed.")
+        held = getattr(self._local, "held", None)
+        if held is None:
+            held = self._local.held = _ThreadConnections()
+            with self._lock:
+                self._connections[id(held)] = held.opened
+            weakref.finalize(held, _close_connections, self._lock, self._connections, id(held))
+        return held
+
+    def _opened(self, held, conn):
+        with self._lock:
+            held.opened.append(conn)
+        return conn
+
+    @property
+    def connection(self):
+        """The calling thread's connection, opened on first use."""
+        held = self._thread_connections()
+        if held.conn is None:
+            held.conn = self._opened(held, self._connect())
+        return held.conn
+
+    def _archive_connection(self, path, batch):
+        """The calling thread's read-only connection to an archive partition."""
+        held = self._thread_connections()
+        conn, opened_batch = held.archives.get(path, (None, None))
+        if conn is not None and opened_batch != batch:
+            # A later archive run committed more rows; reopen to show them.
+            with self._lock:
+                held.opened.remove(conn)
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = self._opened(held, archive.open_partition(self.db_file, path, batch))
+            held.archives[path] = (conn, batch)
+        return conn
+
+    def for_user(self, user_id):
+        """
+        Return a DataManager scoped to user_id that shares this one's connections,
+        write buffer and metrics.
+
+        Views are cheap, so a server can create one per request. Closing any of
+        them closes the shared connections; close the original instead.
+        """
+        view = copy.copy(self)
+        view.user_id = user_id
+        return view
+
+    def flush(self):
+        """Write every buffered workout. A no-op without a write buffer."""
+        if self._write_buffer is not None and self._write_buffer.pending:
+            with self.metrics.timer("flush"):
+                self._write_buffer.flush()
+
+    def close(self):
+        """Write buffered workouts, then close every connection opened by this DataManager. Safe to call twice."""
+        if self._write_buffer is not None:
+            self._write_buffer.close()
+            atexit.unregister(self.flush)
+        with self._lock:
+            self._closed = True
+            connections = [conn for opened in self._connections.values() for conn in opened]
+            for opened in self._connections.values():
+                opened.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                logger.exception("Error closing connection")
+
+    def query(self, operation, sql, params=()):
+        """
+        Run a read-only statement and return all its rows, timed as operation.
+
+        Every read goes through here, so it shows up in self.metrics and, if it
+        is slow, in the slow-query log with its plan.
+        """
+        self.flush()
+        conn = self.connection
+        with self.metrics.timer(operation, sql, params, conn) as timing:
+            rows = conn.execute(sql, params).fetchall()
+            timing.rows = len(rows)
+        return rows
+
+    def partitions(self, start=None, end=None):
+        """
+        Return the archive partitions (see archive.py) that can hold workouts
+        dated [start, end), as (name, path, start, end, batch) tuples, newest first.
+        """
+        return archive.partitions(self.connection, to_epoch(start) if start is not None else None,
+                                  to_epoch(end) if end is not None else None)
+
+    def query_all(self, operation, sql, params=(), start=None, end=None, partitions=None):
+        """
+        Run a read-only statement on the hot table and on every archive partition
+        that can hold workouts dated [start, end).
+
+        The statement sees a `workouts` table with the same columns everywhere.
+        Partitions outside the range are not opened at all.
+
+        Parameters:
+            partitions (list): The partitions to read, if already looked up with partitions().
+
+        Returns:
+            list: One list of rows per source, the hot table's first.
+        """
+        results = [self.query(operation, sql, params)]
+        results.extend(self._query_partitions(operation, sql, params,
+                                              partitions if partitions is not None else self.partitions(start, end)))
+        return results
+
+    def _query_partitions(self, operation, sql, params, partitions):
+        results = []
+        for _, path, _, _, batch in partitions:
+            conn = self._archive_connection(path, batch)
+            with self.metrics.timer(f"{operation}.archive", sql, params, conn) as timing:
+                rows = conn.execute(sql, params).fetchall()
+                timing.rows = len(rows)
+            results.append(rows)
+        return results
+
     def init_db(self):
-        """Initialize the SQLite database and create the workouts table if it doesn't exist."""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS workouts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                workout_type TEXT NOT NULL,
-                duration INTEGER NOT NULL,
-                calories INTEGER NOT NULL
-            )
-        """)
-        conn.commit()
-        conn.close()
-    
-    def log_workout(self, workout_type, duration, calories):
+        """Create the workouts table if needed and upgrade it to the latest schema version."""
+        migrate(self.connection)
+        self.reload_types()
+
+    def reload_types(self):
+        """Pick up workout types added to the database by other processes."""
+        rows = self.connection.execute("SELECT id, name FROM workout_types WHERE id >= ? ORDER BY id",
+                                       (len(self._types),)).fetchall()
+        with self._types_lock:
+            for code, name in rows:
+                if code == len(self._types):
+                    self._types.add(name)
+
+    def workout_types(self):
+        """
+        Return the names of every known workout type, in code order.
+
+        Served from memory, so the UI can fill its lists without a query.
+        """
+        return list(self._types.names)
+
+    def type_code(self, name):
+        """Return the integer code of a workout type, or -1 if there is no such type."""
+        code = self._types.encode(name)
+        if code < 0:
+            self.reload_types()
+            code = self._types.encode(name)
+        return code
+
+    def type_name(self, code):
+        """Return the name of a workout type code."""
+        name = self._types.decode(code)
+        if name is None:
+            self.reload_types()
+            name = self._types.decode(code)
+        return name
+
+    def add_type(self, name):
+        """
+        Return the code of a workout type, adding it to workout_types if it is new.
+
+        Raises:
+            ValueError: If name is empty.
+        """
+        code = self._types.encode(name)
+        if code >= 0:
+            return code
+        if not name or not name.strip():
+            raise ValueError("Workout type cannot be empty.")
+        conn = self.connection
+        with conn:
+            # Codes stay dense: the next code is always one past the largest.
+            # If another process added the same name first, this is a no-op.
+            conn.execute("""
+                INSERT OR IGNORE INTO workout_types (id, name)
+                SELECT COALESCE(MAX(id) + 1, 0), ? FROM workout_types
+            """, (name,))
+        self.reload_types()
+        return self._types.encode(name)
+
+    def _with_names(self, rows):
+        # Replace the type code of (id, date, type_id, duration, calories) rows by its name.
+        names = self._types.names
+        if any(code >= len(names) for _, _, code, _, _ in rows):
+            self.reload_types()
+        return [(workout_id, date, names[code], duration, calories)
+                for workout_id, date, code, duration, calories in rows]
+
+    def log_workout(self, workout_type, duration, calories, date=None):
         """
         Log a new workout to the SQLite database.
-        
+
         Parameters:
-            workout_type (str): e.g., "Run", "Walk", "Strenght"
+            workout_type (str): e.g., "Run", "Walk", "Strenght"; new types are added to workout_types.
             duration (int): Duration in minutes
             calories (int): Calories burned
-        
+            date: When the workout happened (see to_epoch). Defaults to now.
+
         Returns:
             bool: True if successful, False otherwise.
         """
-        date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO workouts (date, workout_type, duration, calories)
-                VALUES (?, ?, ?, ?)
-            """, (date, workout_type, duration, calories))
-            conn.commit()
-            conn.close()
+            params = (to_epoch(date if date is not None else datetime.now()), self.add_type(workout_type),
+                      duration, calories, self.user_id)
+            if self._write_buffer is not None:
+                with self.metrics.timer("log_workout.buffered"):
+                    return self._write_buffer.put(params, wait=self.durability == "committed")
+            conn = self.connection
+            with self.metrics.timer("log_workout", INSERT_SQL, params, conn) as timing:
+                with conn:
+                    timing.rows = conn.execute(INSERT_SQL, params).rowcount
             return True
-        except Exception as e:
-            print(f"Error logging workout: {e}")
+        except Exception:
+            logger.exception("Error logging workout")
             return False
 
-    def get_past_workouts(self):
+    def log_workouts_bulk(self, workouts, chunk_size=5000):
+        """
+        Log many workouts with explicit dates, e.g. when backfilling history.
+
+        Rows are written with executemany, one transaction per chunk, so the
+        iterable is consumed lazily and never held in memory as a whole.
+
+        Parameters:
+            workouts (iterable): (date, workout_type, duration, calories) tuples or
+                dicts with those keys. Dates are converted with to_epoch.
+            chunk_size (int): Number of rows written per transaction.
+
+        Returns:
+            int: Number of rows written. On error the failing chunk is rolled back
+            and the rows committed before it are counted.
+        """
+        written = 0
+        rows = ((date, self.add_type(workout_type), duration, calories, self.user_id)
+                for date, workout_type, duration, calories in map(_workout_row, workouts))
+        try:
+            self.flush()
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                # Timed per chunk but kept out of the slow-query log: a chunk of
+                # thousands of rows is meant to take a while.
+                with self.metrics.timer("log_workouts_bulk") as timing:
+                    self._insert_rows(chunk)
+                    timing.rows = len(chunk)
+                written += len(chunk)
+        except Exception:
+            logger.exception("Error logging workouts in bulk after %d rows", written)
+        return written
+
+    def _insert_rows(self, rows):
+        """Insert (date, type_id, duration, calories, user_id) rows in one transaction."""
+        conn = self.connection
+        if len(rows) < BULK_ROLLUP_MIN_ROWS:
+            with conn:
+                conn.executemany(INSERT_SQL, rows)
+            return
+        with conn:
+            # Skip the per-row rollup trigger and fold all the rows into the
+            # rollups at once; the flag is never visible outside this transaction.
+            conn.execute("UPDATE db_state SET value = 1 WHERE name = 'bulk_load'")
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM workouts").fetchone()[0]
+            conn.executemany(INSERT_SQL, rows)
+            add_to_rollups(conn, last_id)
+            conn.execute("UPDATE db_state SET value = 0 WHERE name = 'bulk_load'")
+
+    def _write_batch(self, rows):
+        # Called by the write buffer's flusher thread with one batch.
+        with self.metrics.timer("write_batch") as timing:
+            self._insert_rows(rows)
+            timing.rows = len(rows)
+
+    def workout_filters(self, start=None, end=None, workout_type=None):
+        """Build the WHERE conditions and parameters shared by the read methods, always scoped to user_id."""
+        conditions, params = ["user_id = ?"], [self.user_id]
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(to_epoch(start))
+        if end is not None:
+            conditions.append("date < ?")
+            params.append(to_epoch(end))
+        if workout_type is not None:
+            conditions.append("type_id = ?")
+            params.append(self.type_code(workout_type))
+        return conditions, params
+
+    def get_workouts_page(self, after=None, page_size=100, start=None, end=None,
+                          workout_type=None, descending=True, order_by="date"):
+        """
+        Retrieve one page of workouts using keyset pagination.
+
+        Instead of OFFSET, each page continues from the sort key of the last row
+        of the previous page, so every page is an index range scan and costs the
+        same no matter how deep into the history it is.
+
+        Parameters:
+            after (tuple): sort_key() of the last row already seen, or None for the
+                first page. For the default date order this is (date, id).
+            page_size (int): Maximum number of rows to return.
+            start: Only workouts on or after this time (see to_epoch).
+            end: Only workouts before this time (see to_epoch).
+            workout_type (str): Only workouts of this type.
+            descending (bool): Largest (newest) first if True, smallest first otherwise.
+            order_by (str): Column to sort by, one of SORT_KEYS.
+
+        Archive partitions are read with the same keyset query and merged in.
+        In date order, partitions past the keyset are skipped, and so are
+        those entirely older (or newer) than a page that is already full.
+
+        Returns:
+            list: Tuples of (id, date, workout_type, duration, calories).
+        """
+        if order_by not in SORT_KEYS:
+            raise ValueError(f"Cannot sort workouts by '{order_by}'.")
+        key = SORT_KEYS[order_by]
+        conditions, params = self.workout_filters(start, end, workout_type)
+        if after is not None:
+            after = list(after)
+            if "date" in key:
+                position = key.index("date")
+                after[position] = to_epoch(after[position])
+            if "type_id" in key and isinstance(after[key.index("type_id")], str):
+                position = key.index("type_id")
+                after[position] = self.type_code(after[position])
+            placeholders = ", ".join("?" * len(key))
+            comparison = "<" if descending else ">"
+            conditions.append(f"({', '.join(key)}) {comparison} ({placeholders})")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}"
+        direction = "DESC" if descending else "ASC"
+        order = ", ".join(f"{column} {direction}" for column in key)
+        params.append(page_size)
+        sql = f"""
+            SELECT id, date, type_id, duration, calories
+            FROM workouts
+            {where}
+            ORDER BY {order}
+            LIMIT ?
+        """
+        rows = self.query("get_workouts_page", sql, params)
+        low = to_epoch(start) if start is not None else None
+        high = to_epoch(end) if end is not None else None
+        if order_by == "date" and after is not None:
+            if descending:
+                high = after[0] + 1 if high is None else min(high, after[0] + 1)
+            else:
+                low = after[0] if low is None else max(low, after[0])
+        partitions = self.partitions(low, high)
+        if not descending:
+            partitions.reverse()
+        for partition in partitions:
+            if order_by == "date" and len(rows) >= page_size:
+                # A full page whose last row is newer (older) than every row
+                # of the partition cannot take any of them.
+                last_date = rows[page_size - 1][1]
+                partition_start, partition_end = partition[2], partition[3]
+                if (last_date >= partition_end) if descending else (last_date < partition_start):
+                    continue
+            rows.extend(self._query_partitions("get_workouts_page", sql, params, [partition])[0])
+            rows.sort(key=lambda row: sort_key(row, order_by), reverse=descending)
+            del rows[page_size:]
+        return self._with_names(rows)
+
+    def iter_workouts(self, page_size=1000, after=None, start=None, end=None,
+                      workout_type=None, descending=True, order_by="date"):
+        """
+        Stream workouts page by page.
+
+        Only one page is held in memory at a time and no read transaction stays
+        open between pages, so writers are never held up by a slow consumer.
+        Takes the same arguments as get_workouts_page.
+
+        Yields:
+            tuple: (id, date, workout_type, duration, calories)
+        """
+        while True:
+            page = self.get_workouts_page(after, page_size, start, end, workout_type,
+                                          descending, order_by)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = sort_key(page[-1], order_by)
+
+    def get_past_workouts(self, start=None, end=None, workout_type=None):
         """
         Retrieve past workouts from the SQLite database.
-        
+
+        Prefer iter_workouts or get_workouts_page for large histories; this
+        method materializes every matching row.
+
+        Parameters:
+            start: Only workouts on or after this time (see to_epoch).
+            end: Only workouts before this time (see to_epoch).
+            workout_type (str): Only workouts of this type.
+
         Returns:
-            list: List of tuples containing (id, date, workout_type, duration, calories)
+            list: List of tuples containing (id, date, workout_type, duration, calories),
+            newest first. date is in epoch seconds; see parse_date and format_date.
         """
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, date, workout_type, duration, calories 
-                FROM workouts 
-                ORDER BY date DESC
-            """)
-            workouts = cursor.fetchall()
-            conn.close()
+            with self.metrics.timer("get_past_workouts") as timing:
+                workouts = list(self.iter_workouts(start=start, end=end, workout_type=workout_type))
+                timing.rows = len(workouts)
             return workouts
-        except Exception as e:
-            print(f"Error retrieving workouts: {e}")
+        except Exception:
+            logger.exception("Error retrieving workouts")
             return []
-    
+
     def update_workout(self, workout_id, workout_type, duration, calories):
         """
         Update an existing workout.
-        
+
         Parameters:
-            workout_id (int): The id of the workout to update.
-            workout_type (str): New workout type.
+            workout_id (int): The id of the workout to update. Only the current
+                user's workouts can be changed.
+            workout_type (str): New workout type; added to workout_types if new.
             duration (int): New duration.
             calories (int): New calories.
-            
+
         Returns:
-            bool: True if successful, False otherwise.
+            bool: True if the workout was updated, False on error or if this user
+            has no such workout in the hot table (archived workouts are read-only).
         """
+        sql = "UPDATE workouts SET type_id=?, duration=?, calories=? WHERE id=? AND user_id=?"
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE workouts SET workout_type=?, duration=?, calories=? WHERE id=?
-            """, (workout_type, duration, calories, workout_id))
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error updating workout: {e}")
+            params = (self.add_type(workout_type), duration, calories, workout_id, self.user_id)
+            self.flush()
+            conn = self.connection
+            with self.metrics.timer("update_workout", sql, params, conn) as timing:
+                with conn:
+                    timing.rows = conn.execute(sql, params).rowcount
+            return timing.rows > 0
+        except Exception:
+            logger.exception("Error updating workout %s", workout_id)
             return False
 
     def delete_workout(self, workout_id):
         """
         Delete a workout from the database.
-        
+
         Parameters:
-            workout_id (int): The id of the workout to delete.
-            
+            workout_id (int): The id of the workout to delete. Only the current
+                user's workouts can be deleted.
+
         Returns:
-            bool: True if successful, False otherwise.
+            bool: True if the workout was deleted, False on error or if this user
+            has no such workout in the hot table (archived workouts are read-only).
         """
+        sql = "DELETE FROM workouts WHERE id=? AND user_id=?"
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM workouts WHERE id=?", (workout_id,))
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error deleting workout: {e}")
+            self.flush()
+            conn = self.connection
+            params = (workout_id, self.user_id)
+            with self.metrics.timer("delete_workout", sql, params, conn) as timing:
+                with conn:
+                    timing.rows = conn.execute(sql, params).rowcount
+            return timing.rows > 0
+        except Exception:
+            logger.exception("Error deleting workout %s", workout_id)
             return False
+
+def modulo_partition(user_id, shards):
+    """Default partitioning function: spread integer user ids evenly over the shards."""
+    return user_id % shards
+
+class ShardedDataManager:
+    def __init__(self, pattern="workouts-{shard:03d}.db", shards=16, partition=modulo_partition, **options):
+        """
+        Spread users over several database files.
+
+        Every user lives in exactly one shard, chosen by partition(user_id,
+        shards), so a user's reads touch one file's per-user indexes and writes
+        for users on different shards never contend for the same lock. Shards are
+        opened on first use.
+
+        Parameters:
+            pattern (str): Shard file name, formatted with shard=<index>.
+            shards (int): Number of shard files. Changing it (or the partitioning
+                function) moves users to other files, so it is fixed per deployment.
+            partition (callable): (user_id, shards) -> shard index.
+            **options: Passed to every shard's DataManager.
+        """
+        self.pattern = pattern
+        self.shards = shards
+        self.partition = partition
+        self.options = options
+        self._managers = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def shard_of(self, user_id):
+        """Return the index of the shard holding user_id."""
+        shard = self.partition(user_id, self.shards)
+        if not 0 <= shard < self.shards:
+            raise ValueError(f"Partition function returned shard {shard} for user {user_id}.")
+        return shard
+
+    def shard(self, index):
+        """Return the DataManager of one shard, opening it if needed."""
+        with self._lock:
+            manager = self._managers.get(index)
+            if manager is None:
+                manager = DataManager(self.pattern.format(shard=index), **self.options)
+                self._managers[index] = manager
+        return manager
+
+    def for_user(self, user_id):
+        """Return a DataManager scoped to user_id on the user's shard."""
+        return self.shard(self.shard_of(user_id)).for_user(user_id)
+
+    def close(self):
+        """Close every shard that has been opened."""
+        with self._lock:
+            managers, self._managers = list(self._managers.values()), {}
+        for manager in managers:
+            manager.close()
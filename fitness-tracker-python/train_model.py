@@ -1,43 +1,431 @@
 # train_model.py
+import argparse
+import os
 import sqlite3
 import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
+import features
+from sklearn.base import clone
+from sklearn.ensemble import ExtraTreesClassifier, HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.naive_bayes import GaussianNB
+from migrations import migrate
+from vocabulary import WorkoutVocabulary
 
-def fetch_training_data(db_file='workouts.db'):
-    # Connect to your database and extract historical workout data.
-    # For this simple example, let’s assume we use the previous exercise type (as an encoded value)
-    # and duration as features, and the next exercise type as the label.
+MODEL_FILE = "next_exercise_model.pkl"
+# Model families the search can try, by name.
+MODEL_FAMILIES = {
+    "random_forest": RandomForestClassifier,
+    "extra_trees": ExtraTreesClassifier,
+    "hist_gradient_boosting": HistGradientBoostingClassifier,
+    "gaussian_nb": GaussianNB,
+}
+# (family, parameters) pairs tried by train_search.
+SEARCH_CANDIDATES = [
+    ("random_forest", {"n_estimators": 100, "random_state": 42}),
+    ("random_forest", {"n_estimators": 100, "max_depth": 12, "min_samples_leaf": 5, "random_state": 42}),
+    ("random_forest", {"n_estimators": 50, "max_depth": 8, "random_state": 42}),
+    ("extra_trees", {"n_estimators": 100, "min_samples_leaf": 5, "random_state": 42}),
+    ("hist_gradient_boosting", {"max_iter": 100, "learning_rate": 0.1, "random_state": 42}),
+    ("hist_gradient_boosting", {"max_iter": 200, "learning_rate": 0.05, "max_depth": 6, "random_state": 42}),
+    ("gaussian_nb", {}),
+]
+# A model without partial_fit is refit by train_incremental once the workouts
+# logged since its checkpoint reach this fraction of the ones it was trained on.
+REFIT_FRACTION = 0.05
+
+def _type_mapping(conn, vocabulary):
+    # Translate workout_types codes into vocabulary codes, adding types the
+    # vocabulary has not seen. For a vocabulary that grew alongside the
+    # database this is the identity.
+    names = [name for name, in conn.execute("SELECT name FROM workout_types ORDER BY id")]
+    return np.array([vocabulary.add(name) for name in names], dtype=np.int32)
+
+def _read_features(db_file, vocabulary, chunk_size=100000, after_id=None, user_id=None):
+    """
+    Read training examples from the feature store (see features.py) in chunks into NumPy arrays.
+
+    The store is refreshed first. Every stored row is one example: its
+    features.FEATURES are X and the workout's own type is y. Rows come in
+    date order, or in id order (the order they were logged) when after_id is
+    given, which is what incremental training uses.
+
+    Parameters:
+        user_id (int): Only this user's workouts, or None for every user.
+
+    Returns:
+        tuple: (X, y, last_id) where last_id is the largest id read, or
+        after_id if there were no rows. X is float32, the dtype the tree
+        models work in, so fitting does not copy it.
+    """
     conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
-    cursor.execute("SELECT workout_type, duration FROM workouts ORDER BY date")
-    data = cursor.fetchall()
-    conn.close()
-
-    # Create a very simple dataset:
-    # For example, for every consecutive pair of workouts, use the first workout's type and duration as features
-    # and the next workout's type as the label.
-    X, y = [], []
-    for i in range(len(data)-1):
-        current_type, current_duration = data[i]
-        next_type, _ = data[i+1]
-        # Here, we need to convert the categorical workout type into a numerical value.
-        # You can create a simple mapping for this example.
-        mapping = {"Run": 0, "Walk": 1, "Strenght": 2}
-        feature = [mapping.get(current_type, -1), current_duration]
-        if feature[0] == -1:
-            continue  # skip unknown types
-        X.append(feature)
-        y.append(mapping.get(next_type, 0))
-    return np.array(X), np.array(y)
+    try:
+        migrate(conn)
+        features.refresh_features(conn)
+        # One read transaction, so the count and the rows come from the same snapshot.
+        conn.execute("BEGIN")
+        conditions, params = [], []
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "date, id" if after_id is None else "id"
+        count, last_id = conn.execute(f"SELECT COUNT(*), MAX(id) FROM workout_features {where}",
+                                      params).fetchone()
+        # Missing types (-1) map to -1 through the extra last entry.
+        mapping = np.append(_type_mapping(conn, vocabulary), -1)
+        # Positions of the type features in the selected rows, after type_id.
+        type_columns = [position + 1 for position, name in enumerate(features.FEATURES)
+                        if name in features.TYPE_FEATURES]
+        X = np.empty((count, len(features.FEATURES)), dtype=np.float32)
+        y = np.empty(count, dtype=np.int32)
+        cursor = conn.execute(f"""
+            SELECT type_id, {', '.join(features.FEATURES)} FROM workout_features {where} ORDER BY {order}
+        """, params)
+        position = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = np.array(rows, dtype=np.int64)
+            chunk[:, type_columns] = mapping[chunk[:, type_columns]]
+            end = position + len(rows)
+            y[position:end] = mapping[chunk[:, 0]]
+            X[position:end] = chunk[:, 1:]
+            position = end
+    finally:
+        conn.close()
+    return X, y, last_id if last_id is not None else after_id
 
-if __name__ == "__main__":
-    X, y = fetch_training_data()
+def fetch_training_data(db_file='workouts.db', vocabulary=None, chunk_size=100000, user_id=None):
+    # Connect to your database and extract historical workout data.
+    # Each workout is one example: the features of the history before it
+    # (see features.FEATURES) predict its type, encoded with `vocabulary`,
+    # which learns any type it has not seen yet. The features are computed
+    # once, in SQL, by the feature store the app also predicts from.
+    #
+    # Rows are read in chunks straight into preallocated NumPy arrays, so memory
+    # stays at a few dozen bytes per workout however large the table is.
+    # user_id limits the data to one user.
+    if vocabulary is None:
+        vocabulary = WorkoutVocabulary()
+    X, y, _ = _read_features(db_file, vocabulary, chunk_size, user_id=user_id)
+    return X, y
+
+def load_model(model_file=MODEL_FILE):
+    """
+    Load a saved model checkpoint.
+
+    Returns:
+        dict: {"model", "vocabulary", "features", "last_id", "user_id",
+        "training_rows", "metadata"}, or None if no model has been trained. "features" is None
+        for models trained before the feature store, which only took the
+        previous workout's type and duration; they must be retrained, and
+        train_incremental does so.
+    """
+    if not os.path.exists(model_file):
+        return None
+    with open(model_file, "rb") as f:
+        checkpoint = pickle.load(f)
+    if not isinstance(checkpoint, dict):
+        checkpoint = {"model": checkpoint, "vocabulary": None, "last_id": None}
+    checkpoint.setdefault("features", None)
+    checkpoint.setdefault("user_id", None)
+    checkpoint.setdefault("training_rows", None)
+    checkpoint.setdefault("metadata", None)
+    return checkpoint
+
+def save_model(checkpoint, model_file=MODEL_FILE):
+    """Pickle a checkpoint atomically, so the app never loads a half-written file."""
+    tmp_file = f"{model_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump(checkpoint, f)
+    os.replace(tmp_file, model_file)
+
+def _checkpoint(model, vocabulary, last_id, user_id=None, metadata=None, training_rows=None):
+    return {
+        "model": model,
+        "vocabulary": list(vocabulary.names),
+        # The feature store columns the model takes, in order.
+        "features": list(features.FEATURES),
+        "last_id": last_id,
+        # The user the model was trained for, or None for every user.
+        "user_id": user_id,
+        # Number of examples the model has learned from.
+        "training_rows": training_rows,
+        # How the model was chosen, for models trained by train_search.
+        "metadata": metadata,
+    }
+
+def train_full(db_file='workouts.db', model_file=MODEL_FILE, incremental=False, user_id=None):
+    """
+    Train from scratch over the whole feature store and save the checkpoint.
+
+    Parameters:
+        incremental (bool): Train a GaussianNB, which later train_incremental
+            calls can update, instead of the default RandomForestClassifier.
+        user_id (int): Train on this user's workouts only. None trains one model
+            on every user's history.
+
+    Returns:
+        dict: The saved checkpoint, or None if there is not enough data.
+    """
+    vocabulary = WorkoutVocabulary.load()
+    X, y, last_id = _read_features(db_file, vocabulary, user_id=user_id)
     if len(X) == 0:
-        print("Not enough data to train the model.")
+        return None
+    if incremental:
+        model = GaussianNB()
+        model.partial_fit(X, y, classes=np.arange(len(vocabulary)))
     else:
         model = RandomForestClassifier(n_estimators=100, random_state=42)
         model.fit(X, y)
-        with open("next_exercise_model.pkl", "wb") as f:
-            pickle.dump(model, f)
+    checkpoint = _checkpoint(model, vocabulary, last_id, user_id, training_rows=len(X))
+    save_model(checkpoint, model_file)
+    vocabulary.save()
+    return checkpoint
+
+def _refit(checkpoint, db_file, model_file, user_id=None):
+    """
+    Retrain the checkpoint's model from scratch over the whole feature store.
+
+    The new model has the same class and parameters, so a model chosen by
+    train_search stays that model, and its metadata is kept with the
+    training rows brought up to date.
+
+    Returns:
+        dict: The saved checkpoint, or None if there is not enough data.
+    """
+    vocabulary = WorkoutVocabulary.load()
+    X, y, last_id = _read_features(db_file, vocabulary, user_id=user_id)
+    if len(X) == 0:
+        return None
+    model = clone(checkpoint["model"])
+    start = time.perf_counter()
+    if hasattr(model, "partial_fit"):
+        model.partial_fit(X, y, classes=np.arange(len(vocabulary)))
+    else:
+        model.fit(X, y)
+    metadata = checkpoint["metadata"]
+    if metadata is not None:
+        metadata = dict(metadata, final_fit_seconds=time.perf_counter() - start, training_rows=len(X),
+                        row_range=_row_range(db_file, last_id, user_id))
+    checkpoint = _checkpoint(model, vocabulary, last_id, user_id, metadata, training_rows=len(X))
+    save_model(checkpoint, model_file)
+    vocabulary.save()
+    return checkpoint
+
+def train_incremental(db_file='workouts.db', model_file=MODEL_FILE, user_id=None):
+    """
+    Update the saved model with the workouts logged since its checkpoint.
+
+    A model with partial_fit learns just the new workouts. A model without it,
+    such as the default random forest or most train_search winners, is refit
+    from scratch with the same class and parameters, but only once the new
+    workouts reach REFIT_FRACTION of the ones it was trained on, so the cost
+    of refitting stays proportional to what there is to learn. The same refit
+    handles a checkpoint that cannot be updated: one trained on other
+    features or for another user, or new workout types the model has no
+    class for. The saved model is never replaced by a different kind of
+    model; only when there is no model yet is a GaussianNB trained, as
+    train_full(incremental=True) does. user_id is as for train_full.
+
+    Returns:
+        dict: The saved checkpoint, or None if there was nothing to learn yet.
+    """
+    checkpoint = load_model(model_file)
+    if checkpoint is None:
+        return train_full(db_file, model_file, incremental=True, user_id=user_id)
+    if (checkpoint["last_id"] is None or checkpoint["user_id"] != user_id
+            or checkpoint["features"] != list(features.FEATURES)):
+        return _refit(checkpoint, db_file, model_file, user_id)
+
+    vocabulary = WorkoutVocabulary(checkpoint["vocabulary"])
+    known_types = len(vocabulary)
+    X, y, last_id = _read_features(db_file, vocabulary, after_id=checkpoint["last_id"], user_id=user_id)
+    if len(X) == 0:
+        return None
+    model = checkpoint["model"]
+    if len(vocabulary) > known_types or not np.isin(y, model.classes_).all():
+        return _refit(checkpoint, db_file, model_file, user_id)
+    if not hasattr(model, "partial_fit"):
+        if len(X) < REFIT_FRACTION * (checkpoint["training_rows"] or 0):
+            return None
+        return _refit(checkpoint, db_file, model_file, user_id)
+    model.partial_fit(X, y)
+    training_rows = (checkpoint["training_rows"] or 0) + len(X)
+    metadata = checkpoint["metadata"]
+    if metadata is not None:
+        metadata = dict(metadata, training_rows=training_rows, row_range=_row_range(db_file, last_id, user_id))
+    checkpoint = _checkpoint(model, vocabulary, last_id, user_id, metadata, training_rows)
+    save_model(checkpoint, model_file)
+    return checkpoint
+
+# Training data of a search worker process, set once by _init_search_worker
+# so the arrays are not sent again with every task.
+_search_data = {}
+
+def _init_search_worker(X, y):
+    _search_data["X"], _search_data["y"] = X, y
+
+def _evaluate_candidate(task):
+    """Fit one candidate on one time-series fold and score it on the following rows."""
+    index, family, params, train_stop, test_start, test_stop = task
+    X, y = _search_data["X"], _search_data["y"]
+    model = MODEL_FAMILIES[family](**params)
+    start = time.perf_counter()
+    model.fit(X[:train_stop], y[:train_stop])
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    predictions = model.predict(X[test_start:test_stop])
+    predict_seconds = time.perf_counter() - start
+    return {
+        "index": index,
+        "accuracy": float(np.mean(predictions == y[test_start:test_stop])),
+        "fit_seconds": fit_seconds,
+        "predict_us_per_row": predict_seconds / max(test_stop - test_start, 1) * 1e6,
+    }
+
+def search_models(X, y, candidates=SEARCH_CANDIDATES, n_splits=5, max_workers=None):
+    """
+    Score every candidate with time-series cross-validation, in parallel.
+
+    Folds are TimeSeriesSplit folds over X in date order: each is trained on
+    the workouts before a point and scored on the ones right after it, as the
+    model is used. Every (candidate, fold) pair is a separate task in a process
+    pool, so the search uses all cores and its wall-clock time grows with the
+    number of tasks divided by the number of cores.
+
+    Parameters:
+        candidates (list): (family, parameters) pairs; family is a MODEL_FAMILIES key.
+        n_splits (int): Number of folds.
+        max_workers (int): Worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        list: One dict per candidate with its family, parameters, mean and
+        standard deviation of the accuracy, mean fit seconds and mean predict
+        latency in microseconds per row, best first.
+    """
+    folds = [(train[-1] + 1, test[0], test[-1] + 1) for train, test in TimeSeriesSplit(n_splits).split(X)]
+    tasks = [(index, family, params) + fold
+             for index, (family, params) in enumerate(candidates) for fold in folds]
+    scores = [[] for _ in candidates]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_search_worker,
+                             initargs=(X, y)) as pool:
+        for result in pool.map(_evaluate_candidate, tasks):
+            scores[result["index"]].append(result)
+    results = []
+    for (family, params), folds_scored in zip(candidates, scores):
+        accuracies = [score["accuracy"] for score in folds_scored]
+        results.append({
+            "family": family,
+            "params": params,
+            "accuracy": float(np.mean(accuracies)),
+            "accuracy_std": float(np.std(accuracies)),
+            "fit_seconds": float(np.mean([score["fit_seconds"] for score in folds_scored])),
+            "predict_us_per_row": float(np.mean([score["predict_us_per_row"] for score in folds_scored])),
+        })
+    # Most accurate first; between equally accurate models, the faster to fit.
+    results.sort(key=lambda result: (-round(result["accuracy"], 4), result["fit_seconds"]))
+    return results
+
+def _row_range(db_file, last_id, user_id=None):
+    conn = sqlite3.connect(db_file)
+    try:
+        # The feature store also holds archived workouts.
+        sql = "SELECT MIN(id), MIN(date), MAX(date) FROM workout_features WHERE id <= ?"
+        params = [last_id]
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params.append(user_id)
+        first_id, first_date, last_date = conn.execute(sql, params).fetchone()
+    finally:
+        conn.close()
+    return {"first_id": first_id, "last_id": last_id, "first_date": first_date, "last_date": last_date,
+            "user_id": user_id}
+
+def train_search(db_file='workouts.db', model_file=MODEL_FILE, n_splits=5, search_rows=200000,
+                 max_workers=None, user_id=None, report=print):
+    """
+    Pick the best model with search_models, refit it on all the data and save it.
+
+    Parameters:
+        n_splits (int): Cross-validation folds.
+        search_rows (int): Only the most recent this many training examples are
+            used for the search, which bounds its cost on long histories; the
+            winner is then refit on every pair. None searches on all of them.
+        max_workers (int): Worker processes for the search.
+        user_id (int): As for train_full.
+        report (callable): Called with a line per candidate, or None.
+
+    Returns:
+        dict: The saved checkpoint, whose "metadata" holds the chosen model,
+        the scores of every candidate and the training row range. None if there
+        is not enough data.
+    """
+    vocabulary = WorkoutVocabulary.load()
+    X, y, last_id = _read_features(db_file, vocabulary, user_id=user_id)
+    if len(X) <= n_splits:
+        return None
+    search_X, search_y = (X, y) if search_rows is None else (X[-search_rows:], y[-search_rows:])
+    results = search_models(search_X, search_y, n_splits=n_splits, max_workers=max_workers)
+    if report:
+        for result in results:
+            report(f"{result['family']:24} {result['accuracy']:.4f} \u00b1 {result['accuracy_std']:.4f}  "
+                   f"fit {result['fit_seconds']:.2f}s  predict {result['predict_us_per_row']:.2f} us/row  "
+                   f"{result['params']}")
+    best = results[0]
+    model = MODEL_FAMILIES[best["family"]](**best["params"])
+    start = time.perf_counter()
+    model.fit(X, y)
+    metadata = {
+        "family": best["family"],
+        "params": best["params"],
+        "metrics": {key: best[key] for key in ("accuracy", "accuracy_std", "fit_seconds", "predict_us_per_row")},
+        "final_fit_seconds": time.perf_counter() - start,
+        "candidates": results,
+        "n_splits": n_splits,
+        "search_rows": len(search_X),
+        "training_rows": len(X),
+        "row_range": _row_range(db_file, last_id, user_id),
+    }
+    checkpoint = _checkpoint(model, vocabulary, last_id, user_id, metadata, training_rows=len(X))
+    save_model(checkpoint, model_file)
+    vocabulary.save()
+    return checkpoint
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the next-exercise prediction model.")
+    parser.add_argument("--db", default="workouts.db", help="Database file (default: workouts.db).")
+    parser.add_argument("--model", default=MODEL_FILE, help=f"Model file (default: {MODEL_FILE}).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Update the model with workouts logged since the last checkpoint.")
+    parser.add_argument("--search", action="store_true",
+                        help="Cross-validate several model families and parameters in parallel and keep the best.")
+    parser.add_argument("--folds", type=int, default=5, help="Time-series folds for --search (default: 5).")
+    parser.add_argument("--search-rows", type=int, default=200000,
+                        help="Most recent workouts used by --search (default: 200000; 0 for all).")
+    parser.add_argument("--workers", type=int, help="Processes for --search (default: one per CPU).")
+    parser.add_argument("--user", type=int, help="Train on this user's workouts only (default: every user).")
+    args = parser.parse_args()
+
+    if args.search:
+        checkpoint = train_search(args.db, args.model, n_splits=args.folds, search_rows=args.search_rows or None,
+                                  max_workers=args.workers, user_id=args.user)
+    elif args.incremental:
+        checkpoint = train_incremental(args.db, args.model, user_id=args.user)
+    else:
+        checkpoint = train_full(args.db, args.model, user_id=args.user)
+    if checkpoint is None:
+        print("Not enough data to train the model." if not args.incremental else "No new workouts to learn from.")
+    elif checkpoint["metadata"] is not None:
+        metadata = checkpoint["metadata"]
+        print(f"Saved {metadata['family']} {metadata['params']} "
+              f"(cross-validated accuracy {metadata['metrics']['accuracy']:.4f}).")
+    else:
         print("Model trained and saved successfully.")
@@ -0,0 +1,59 @@
+# vocabulary.py
+import json
+import os
+
+VOCABULARY_FILE = "workout_vocabulary.json"
+# The codes the original hard-coded mapping used, so existing models keep their meaning.
+DEFAULT_TYPES = ["Run", "Walk", "Strenght"]
+
+class WorkoutVocabulary:
+    """
+    Append-only mapping between workout type names and integer codes.
+
+    A name keeps its code forever once assigned, so a model trained on an
+    older vocabulary still decodes correctly after new types appear.
+    """
+    def __init__(self, names=None):
+        self.names = []
+        self.codes = {}
+        for name in DEFAULT_TYPES if names is None else names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.codes
+
+    def add(self, name):
+        """Return the code for name, assigning the next free code if it is new."""
+        code = self.codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self.names.append(name)
+            self.codes[name] = code
+        return code
+
+    def encode(self, name, default=-1):
+        """Return the code for name without adding it, or default if it is unknown."""
+        return self.codes.get(name, default)
+
+    def decode(self, code, default=None):
+        """Return the name for code, or default if the code is out of range."""
+        code = int(code)
+        return self.names[code] if 0 <= code < len(self.names) else default
+
+    @classmethod
+    def load(cls, path=VOCABULARY_FILE):
+        """Load a saved vocabulary, or return the default one if the file does not exist."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def save(self, path=VOCABULARY_FILE):
+        """Write the vocabulary atomically, so readers never see a partial file."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.names, f)
+        os.replace(tmp_path, path)
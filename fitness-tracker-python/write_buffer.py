@@ -0,0 +1,155 @@
+# write_buffer.py
+"""
+Write-behind buffer that groups many small inserts into one transaction.
+
+Callers put rows on a bounded queue and a single flusher thread writes
+whatever has accumulated as one batch, so a burst of N writes costs one
+commit (and one fsync) instead of N. When the queue is full, put() blocks,
+which slows producers down to the rate the disk can sustain instead of
+letting memory grow without bound.
+"""
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Control items sent through the queue alongside rows.
+_FLUSH = object()
+_STOP = object()
+
+class _Waiter:
+    __slots__ = ("event", "ok")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.ok = False
+
+class WriteBuffer:
+    def __init__(self, write_batch, max_size=10000, max_batch=5000, flush_interval=0.0,
+                 put_timeout=5.0, name="write-buffer"):
+        """
+        Start the flusher thread.
+
+        Parameters:
+            write_batch (callable): Writes a list of rows in one transaction and
+                raises if it fails. Called only from the flusher thread.
+            max_size (int): Rows the queue holds before put() blocks.
+            max_batch (int): Most rows written per transaction.
+            flush_interval (float): Seconds the flusher waits for more rows after
+                the first one of a batch arrives. 0 takes only what is already
+                queued; longer windows make bigger batches at the cost of latency.
+            put_timeout (float): Seconds put() blocks on a full queue before giving up.
+            name (str): Name of the flusher thread.
+        """
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(max_size)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        """Rows queued but not yet committed."""
+        return self._pending
+
+    def put(self, row, wait=False):
+        """
+        Queue a row for writing.
+
+        Parameters:
+            wait (bool): Block until the batch holding the row has been committed.
+
+        Returns:
+            bool: False if the queue stayed full for put_timeout seconds or, when
+            waiting, if the row could not be written; True otherwise.
+        """
+        if self._closed:
+            raise RuntimeError("WriteBuffer has been closed.")
+        waiter = _Waiter() if wait else None
+        with self._lock:
+            self._pending += 1
+        try:
+            self._queue.put((row, waiter), timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._pending -= 1
+            logger.error("Write buffer full for %.1fs; dropping write.", self.put_timeout)
+            return False
+        if waiter is None:
+            return True
+        waiter.event.wait()
+        return waiter.ok
+
+    def flush(self, timeout=None):
+        """Block until every row queued before this call has been written. Returns False on timeout."""
+        if not self._pending or not self._thread.is_alive():
+            return True
+        waiter = _Waiter()
+        self._queue.put((_FLUSH, waiter))
+        return waiter.event.wait(timeout)
+
+    def close(self):
+        """Write everything still queued and stop the flusher thread. Safe to call twice."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((_STOP, None))
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch, waiters, flushed = [], [], []
+            stop = False
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                row, waiter = item
+                if row is _STOP:
+                    stop = True
+                    break
+                if row is _FLUSH:
+                    flushed.append(waiter)
+                    break
+                batch.append(row)
+                waiters.append(waiter)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch, waiters)
+            for waiter in flushed:
+                waiter.event.set()
+            if stop:
+                return
+
+    def _write(self, batch, waiters):
+        try:
+            self.write_batch(batch)
+            results = [True] * len(batch)
+        except Exception:
+            # Retry row by row, so one bad row does not lose the whole batch.
+            logger.exception("Batch of %d buffered writes failed; retrying one at a time.", len(batch))
+            results = []
+            for row in batch:
+                try:
+                    self.write_batch([row])
+                    results.append(True)
+                except Exception:
+                    logger.exception("Dropping buffered write %r", row)
+                    results.append(False)
+        with self._lock:
+            self._pending -= len(batch)
+        for waiter, ok in zip(waiters, results):
+            if waiter is not None:
+                waiter.ok = ok
+                waiter.event.set()